@@ -19,6 +19,9 @@ class SARProcessingConfig:
         'DOWNLOAD_TIMEOUT': 300,
         'CHUNK_SIZE': 8192,
         'MAX_RETRIES': 3,
+        'MAX_PARALLEL_DOWNLOADS': 4,
+        'DEM_CACHE_DIR': './DEM_CACHE',
+        'DEM_CACHE_MAX_BYTES': 2 * 1024**3,
         'VERIFY_DOWNLOADS': True,
         
         # Processing parameters
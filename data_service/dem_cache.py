@@ -0,0 +1,126 @@
+# dem_cache.py - Persistent local store for Copernicus GLO-30 DEM tiles
+
+import os
+import shutil
+import logging
+import threading
+import uuid
+from typing import Optional
+from urllib.parse import urlparse
+
+import requests
+
+COPERNICUS_DEM_BASE_URL = "https://copernicus-dem-30m.s3.eu-central-1.amazonaws.com/"
+
+
+def tile_object_key(tile: str) -> str:
+    """Maps a tile name like N23_E072 to its object key in the Copernicus DEM bucket."""
+    lat, lon = tile.split('_')
+    stem = f"Copernicus_DSM_COG_10_{lat}_00_{lon}_00_DEM"
+    return f"{stem}/{stem}.tif"
+
+
+class DEMTileCache:
+    """
+    Local, size-bounded LRU store of 1x1 degree DEM tiles keyed by tile name.
+
+    Tiles are fetched once from `base_url` (the public S3 bucket by default, or any HTTP
+    server or local directory with the same layout) and read from disk on every later run.
+    Tiles the source does not have (e.g. open ocean) are remembered so they are not
+    requested again.
+    """
+
+    def __init__(self, cache_dir: str = './DEM_CACHE', max_bytes: int = 2 * 1024**3,
+                 base_url: str = COPERNICUS_DEM_BASE_URL, timeout: int = 300,
+                 session: Optional[requests.Session] = None, logger: Optional[logging.Logger] = None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.base_url = base_url
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        self.logger = logger or logging.getLogger('DEM_Downloader')
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path_for(self, tile: str) -> str:
+        return os.path.join(self.cache_dir, f"{tile}.tif")
+
+    def _missing_marker(self, tile: str) -> str:
+        return os.path.join(self.cache_dir, f"{tile}.missing")
+
+    def get(self, tile: str) -> Optional[str]:
+        """Returns the local path of a tile, fetching it on a cache miss; None if the source lacks it."""
+        path = self.path_for(tile)
+        if os.path.exists(path):
+            os.utime(path)  # Mark as recently used
+            self.logger.info(f"DEM tile {tile} served from local cache: {path}")
+            return path
+        if os.path.exists(self._missing_marker(tile)):
+            self.logger.info(f"DEM tile {tile} is known to be absent from the source. Skipping.")
+            return None
+
+        if not self._fetch(tile, path):
+            return None
+        self.evict(keep=path)
+        return path
+
+    def _fetch(self, tile: str, path: str) -> bool:
+        source = self.base_url.rstrip('/') + '/' + tile_object_key(tile)
+        staging_path = f"{path}.{uuid.uuid4().hex}.partial"
+        parsed = urlparse(self.base_url)
+        try:
+            if parsed.scheme in ('http', 'https'):
+                self.logger.info(f"Fetching DEM tile {tile}: {source}")
+                with self.session.get(source, stream=True, timeout=self.timeout) as response:
+                    if response.status_code in (403, 404):  # S3 answers 403 for keys that do not exist
+                        self.logger.warning(f"Tile not found at {source} (Status: {response.status_code}). Skipping.")
+                        open(self._missing_marker(tile), 'w').close()
+                        return False
+                    response.raise_for_status()
+                    with open(staging_path, 'wb') as f:
+                        for chunk in response.iter_content(chunk_size=1 << 20):
+                            f.write(chunk)
+            else:
+                # Local directory (or file:// URL) laid out like the bucket
+                local_source = os.path.join(parsed.path if parsed.scheme == 'file' else self.base_url, tile_object_key(tile))
+                if not os.path.exists(local_source):
+                    self.logger.warning(f"Tile not found at {local_source}. Skipping.")
+                    open(self._missing_marker(tile), 'w').close()
+                    return False
+                shutil.copyfile(local_source, staging_path)
+            os.replace(staging_path, path)
+        except (requests.exceptions.RequestException, OSError) as e:
+            self.logger.warning(f"Could not fetch DEM tile {tile} from {source}. Skipping. Reason: {e}")
+            if os.path.exists(staging_path):
+                os.remove(staging_path)
+            return False
+
+        self.logger.info(f"Cached DEM tile {tile} ({os.path.getsize(path) / 1024 / 1024:.2f} MB)")
+        return True
+
+    def evict(self, keep: Optional[str] = None) -> None:
+        """Removes least recently used tiles, other than `keep`, until the store fits in max_bytes."""
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.cache_dir):
+                if not name.endswith('.tif'):
+                    continue
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    os.remove(path)
+                    self.logger.info(f"Evicted DEM tile from cache: {path}")
+                except OSError:
+                    continue
+                total -= size
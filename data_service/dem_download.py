@@ -1,9 +1,7 @@
 # dem_download.py - Final Script using Direct AWS S3 Access
 
 import os
-import requests
 import rasterio
-import rasterio.merge
 from shapely.geometry import box
 from shapely.wkt import loads as wkt_loads
 from shapely.errors import ShapelyError
@@ -12,6 +10,9 @@ from datetime import datetime
 from typing import Tuple, Optional, List
 import math
 
+from dem_cache import DEMTileCache
+from dem_mosaic import extract_aoi_dem
+
 
 def setup_logging(log_dir: str = './logs') -> logging.Logger:
     """Setup professional logging."""
@@ -57,9 +58,11 @@ def get_required_dem_tiles(bounds: Tuple[float, float, float, float]) -> List[st
     return tiles
 
 
-def download_dem_from_aws(wkt_aoi: str, output_dir: str = './DEM_DATA') -> Optional[str]:
+def download_dem_from_aws(wkt_aoi: str, output_dir: str = './DEM_DATA',
+                          cache: Optional[DEMTileCache] = None) -> Optional[str]:
     """
     Downloads and clips Copernicus GLO-30 DEM from the public AWS S3 bucket.
+    Tiles are kept in a local DEMTileCache, so repeat runs over the same area read from disk.
     """
     logger = logging.getLogger('DEM_Downloader')
 
@@ -76,50 +79,20 @@ def download_dem_from_aws(wkt_aoi: str, output_dir: str = './DEM_DATA') -> Optio
         logger.error("Could not determine required DEM tiles.")
         return None
 
-    # 2. Construct S3 URLs and open them remotely with rasterio
-    s3_base_url = "https://copernicus-dem-30m.s3.eu-central-1.amazonaws.com/"
-    remote_datasets = []
-    for tile in tile_names:
-        # Example filename: Copernicus_DSM_COG_10_N23_00_E072_00_DEM.tif
-        url = f"{s3_base_url}Copernicus_DSM_COG_10_{tile.split('_')[0]}_00_{tile.split('_')[1]}_00_DEM/Copernicus_DSM_COG_10_{tile.split('_')[0]}_00_{tile.split('_')[1]}_00_DEM.tif"
-        logger.info(f"Checking for remote tile: {url}")
-
-        # Check if URL exists before trying to open
-        try:
-            head_response = requests.head(url)
-            if head_response.status_code == 200:
-                remote_datasets.append(rasterio.open(url))
-            else:
-                logger.warning(f"Tile not found at {url} (Status: {head_response.status_code}). Skipping.")
-        except requests.exceptions.RequestException as e:
-            logger.warning(f"Could not connect to {url}. Skipping. Reason: {e}")
-
-    if not remote_datasets:
+    # 2. Resolve each tile through the local tile store (fetched from S3 only on a miss)
+    cache = cache or DEMTileCache(logger=logger)
+    tile_paths = [path for path in (cache.get(tile) for tile in tile_names) if path]
+
+    if not tile_paths:
         logger.error("No valid DEM tiles found for the AOI on AWS S3.")
         return None
 
-    # 3. Merge and clip the remote datasets
-    logger.info(f"Merging and clipping {len(remote_datasets)} remote tile(s)...")
+    # 3. Read only the AOI window of each tile into a preallocated mosaic
+    logger.info(f"Extracting AOI window from {len(tile_paths)} tile(s)...")
     try:
-        # rasterio.merge.merge is powerful: it reads, merges, and clips in one step
-        merged_data, merged_transform = rasterio.merge.merge(remote_datasets, bounds=bounds, precision=7)
-
-        # Update metadata for the new clipped raster
-        profile = remote_datasets[0].profile
-        profile.update({
-            "height": merged_data.shape[1],
-            "width": merged_data.shape[2],
-            "transform": merged_transform,
-            "driver": "GTiff",
-            "compress": "lzw"
-        })
-
-        # Close remote connections
-        for ds in remote_datasets:
-            ds.close()
-
+        merged_data, merged_transform, profile = extract_aoi_dem(tile_paths, bounds)
     except Exception as e:
-        logger.error(f"Failed during merge and clip process: {e}")
+        logger.error(f"Failed during windowed extraction: {e}")
         return None
 
     # 4. Save the final clipped GeoTIFF
@@ -148,13 +121,16 @@ def main():
     config = {
         'WKT': "POLYGON((72.521 23.042, 72.535 23.042, 72.535 23.032, 72.521 23.032, 72.521 23.042))",
         'DOWNLOAD_DIR': './DEM_DATA',
+        'DEM_CACHE_DIR': './DEM_CACHE',
+        'DEM_CACHE_MAX_BYTES': 2 * 1024**3,
     }
 
     logger.info(f"Area of Interest: {config['WKT']}")
 
     dem_filepath = download_dem_from_aws(
         wkt_aoi=config['WKT'],
-        output_dir=config['DOWNLOAD_DIR']
+        output_dir=config['DOWNLOAD_DIR'],
+        cache=DEMTileCache(config['DEM_CACHE_DIR'], max_bytes=config['DEM_CACHE_MAX_BYTES'], logger=logger)
     )
 
     logger.info("\n" + "=" * 60)
@@ -0,0 +1,89 @@
+# dem_mosaic.py - AOI-windowed reads from DEM tiles into a preallocated mosaic
+
+import math
+import logging
+from typing import List, Optional, Tuple
+
+import numpy as np
+import rasterio
+from rasterio.enums import Resampling
+from rasterio.transform import from_origin
+from rasterio.windows import from_bounds
+
+
+def _snap_bounds(bounds: Tuple[float, float, float, float], transform, xres: float, yres: float) -> Tuple[float, float, float, float]:
+    """Expands bounds outward to the pixel grid defined by a tile's origin and the output resolution."""
+    west, south, east, north = bounds
+    origin_x, origin_y = transform.c, transform.f
+    west = origin_x + math.floor((west - origin_x) / xres + 1e-6) * xres
+    east = origin_x + math.ceil((east - origin_x) / xres - 1e-6) * xres
+    north = origin_y - math.floor((origin_y - north) / yres + 1e-6) * yres
+    south = origin_y - math.ceil((origin_y - south) / yres - 1e-6) * yres
+    return west, south, east, north
+
+
+def extract_aoi_dem(tile_paths: List[str], bounds: Tuple[float, float, float, float],
+                    resolution: Optional[float] = None) -> Tuple[np.ndarray, object, dict]:
+    """
+    Mosaics only the AOI-covering pixels of each DEM tile into a preallocated array.
+
+    For every tile the pixel window intersecting the AOI is computed and read on its own,
+    so only the internal COG blocks under the AOI are decoded. When `resolution` is coarser
+    than the tiles, the decimated read lets GDAL serve it from the matching overview level.
+    Returns (data with shape (1, h, w), transform, profile).
+    """
+    logger = logging.getLogger('DEM_Downloader')
+    if not tile_paths:
+        raise ValueError("At least one DEM tile is required.")
+
+    with rasterio.open(tile_paths[0]) as reference:
+        tile_xres, tile_yres = reference.res
+        xres = max(resolution or tile_xres, tile_xres)
+        yres = max(resolution or tile_yres, tile_yres)
+        dtype = reference.dtypes[0]
+        nodata = reference.nodata
+        profile = reference.profile
+        west, south, east, north = _snap_bounds(bounds, reference.transform, xres, yres)
+
+    width = max(1, round((east - west) / xres))
+    height = max(1, round((north - south) / yres))
+    transform = from_origin(west, north, xres, yres)
+
+    fill_value = nodata if nodata is not None else (np.nan if np.issubdtype(np.dtype(dtype), np.floating) else 0)
+    mosaic = np.full((1, height, width), fill_value, dtype=dtype)
+
+    for path in tile_paths:
+        with rasterio.open(path) as src:
+            tile_west, tile_south, tile_east, tile_north = src.bounds
+            part_west, part_east = max(west, tile_west), min(east, tile_east)
+            part_south, part_north = max(south, tile_south), min(north, tile_north)
+            if part_west >= part_east or part_south >= part_north:
+                continue
+
+            # Destination pixels covered by this tile
+            col_start = round((part_west - west) / xres)
+            col_stop = round((part_east - west) / xres)
+            row_start = round((north - part_north) / yres)
+            row_stop = round((north - part_south) / yres)
+            if col_stop <= col_start or row_stop <= row_start:
+                continue
+
+            window = from_bounds(part_west, part_south, part_east, part_north, transform=src.transform)
+            window = window.round_offsets().round_lengths()
+            logger.info(f"Reading window {window} of {path} into mosaic rows {row_start}:{row_stop}, cols {col_start}:{col_stop}")
+            data = src.read(
+                1, window=window, out_shape=(row_stop - row_start, col_stop - col_start),
+                resampling=Resampling.nearest
+            )
+            valid = data != src.nodata if src.nodata is not None else np.ones(data.shape, dtype=bool)
+            mosaic[0, row_start:row_stop, col_start:col_stop][valid] = data[valid]
+
+    profile.update({
+        "height": height,
+        "width": width,
+        "count": 1,
+        "transform": transform,
+        "driver": "GTiff",
+        "compress": "lzw",
+    })
+    return mosaic, transform, profile
@@ -9,14 +9,19 @@ from typing import List, Tuple, Dict, Optional
 from shapely.wkt import loads as wkt_loads
 from shapely.errors import ShapelyError
 import json
-import requests
 import rasterio
-import rasterio.merge
 import math
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from geopy.geocoders import Nominatim
 from geopy.exc import GeocoderTimedOut, GeocoderUnavailable
 from dotenv import load_dotenv
 
+from dem_cache import DEMTileCache
+from dem_mosaic import extract_aoi_dem
+from terrain import write_slope_geotiff
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -68,9 +73,10 @@ def create_netrc_file() -> bool:
 
 def download_sar_geotiffs(wkt_aoi: str, start_date: str, end_date: str,
                          polarizations: List[str] = ['VV'], 
-                         download_dir: str = './SAR_DATA') -> Dict[str, any]:
+                         download_dir: str = './SAR_DATA',
+                         max_workers: int = 4, max_retries: int = 3) -> Dict[str, any]:
     """
-    Finds scenes, downloads pre/post files, and replaces any existing ones.
+    Finds scenes, downloads pre/post files in parallel, and replaces any existing ones.
     """
     logger = logging.getLogger('SAR_Processor')
 
@@ -112,34 +118,82 @@ def download_sar_geotiffs(wkt_aoi: str, start_date: str, end_date: str,
 
     # --- MODIFIED: The session is now created without arguments ---
     # It will automatically find the .netrc file we created.
+    # A single session is shared by every download thread so authentication happens once.
     session = asf.ASFSession()
     downloaded_files = {pol: [] for pol in polarizations}
-    
-    logger.info(f"Starting download for {len(products_to_download)} selected scene(s)...")
-    
+
+    # Every (scene, polarization) GeoTIFF is an independent download task
+    tasks = []
     for product in products_to_download:
         scene_name = product.properties['sceneName']
         time_tag = 'pre' if product == valid_oldest_scene else 'post'
         logger.info(f"Processing {time_tag} scene: {scene_name}")
+        urls = product.properties.get("additionalUrls", [])
+        for pol in polarizations:
+            for url in (u for u in urls if u.endswith(f"_{pol}.tif")):
+                final_filepath = os.path.join(pol_dirs[pol], f"{pol.lower()}_{time_tag}.tif")
+                tasks.append((scene_name, pol, url, final_filepath))
+
+    logger.info(f"Starting download of {len(tasks)} file(s) from {len(products_to_download)} selected scene(s) "
+                f"with up to {max_workers} parallel worker(s)...")
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        futures = {
+            pool.submit(_download_with_retry, url, pol_dirs[pol], final_filepath, session, max_retries): (scene_name, pol, final_filepath)
+            for scene_name, pol, url, final_filepath in tasks
+        }
+        for completed, future in enumerate(as_completed(futures), start=1):
+            scene_name, pol, final_filepath = futures[future]
+            try:
+                future.result()
+                downloaded_files[pol].append(final_filepath)
+                logger.info(f"[{completed}/{len(tasks)}] ✅ Successfully created: {os.path.basename(final_filepath)}")
+            except Exception as e:
+                logger.error(f"[{completed}/{len(tasks)}] Download failed for {scene_name} ({pol}): {e}")
+
+    return {'success': True, 'downloaded_files': downloaded_files}
 
+def _download_once(url: str, staging_path: str, session, timeout: int = 300) -> None:
+    """Streams one file to staging_path, failing if fewer bytes arrive than the server announced."""
+    with session.get(url, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        expected = response.headers.get('Content-Length')
+        with open(staging_path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=1 << 20):
+                f.write(chunk)
+    if expected is not None and os.path.getsize(staging_path) != int(expected):
+        raise IOError(f"incomplete download: {os.path.getsize(staging_path)} of {expected} bytes")
+
+
+def _download_with_retry(url: str, target_dir: str, final_filepath: str, session, max_retries: int = 3) -> str:
+    """
+    Downloads one GeoTIFF, retrying with exponential backoff, and renames it to its simple name.
+
+    Every attempt writes to its own temporary file, which is removed if the attempt fails;
+    only a complete download (checked against Content-Length) is moved into place.
+    """
+    logger = logging.getLogger('SAR_Processor')
+    original_filename = os.path.basename(url)
+    for attempt in range(1, max_retries + 1):
+        started = time.monotonic()
+        staging_path = os.path.join(target_dir, f"{original_filename}.{uuid.uuid4().hex}.partial")
+        logger.info(f"⬇️ {original_filename}: attempt {attempt}/{max_retries}")
         try:
-            urls = product.properties.get("additionalUrls", [])
-            for pol in polarizations:
-                for url in (u for u in urls if u.endswith(f"_{pol}.tif")):
-                    original_filename = os.path.basename(url)
-                    simple_filename = f"{pol.lower()}_{time_tag}.tif"
-                    final_filepath = os.path.join(pol_dirs[pol], simple_filename)
-                    
-                    asf.download_url(url, path=pol_dirs[pol], filename=original_filename, session=session)
-                    
-                    if os.path.exists(final_filepath): os.remove(final_filepath)
-                    os.rename(os.path.join(pol_dirs[pol], original_filename), final_filepath)
-                    logger.info(f"✅ Successfully created: {simple_filename}")
-                    downloaded_files[pol].append(final_filepath)
+            _download_once(url, staging_path, session)
+            break
         except Exception as e:
-            logger.error(f"Download failed for {scene_name}: {e}")
+            if os.path.exists(staging_path):
+                os.remove(staging_path)
+            if attempt == max_retries:
+                raise
+            delay = 2 ** attempt
+            logger.warning(f"{original_filename}: attempt {attempt} failed ({e}); retrying in {delay}s")
+            time.sleep(delay)
 
-    return {'success': True, 'downloaded_files': downloaded_files}
+    size_mb = os.path.getsize(staging_path) / 1024 / 1024
+    logger.info(f"{original_filename}: {size_mb:.1f} MB in {time.monotonic() - started:.1f}s")
+    os.replace(staging_path, final_filepath)
+    return final_filepath
 
 # --- All other functions (DEM, validation) can remain the same ---
 def is_valid_wkt(wkt_string: str) -> Tuple[bool, Optional[str]]:
@@ -157,7 +211,7 @@ def are_valid_dates(start_str: str, end_str: str) -> Tuple[bool, Optional[str]]:
     except ValueError as e:
         return False, f"Date parsing error: {str(e)}"
 
-def download_dem_from_aws(wkt_aoi: str, output_dir: str = './DEM_DATA') -> Optional[str]:
+def download_dem_from_aws(wkt_aoi: str, output_dir: str = './DEM_DATA', cache: Optional[DEMTileCache] = None) -> Optional[str]:
     logger = logging.getLogger('SAR_Processor')
     try:
         aoi_geom = wkt_loads(wkt_aoi)
@@ -167,26 +221,22 @@ def download_dem_from_aws(wkt_aoi: str, output_dir: str = './DEM_DATA') -> Optio
         return None
     west, south, east, north = bounds
     tiles = [f"{'N' if lat >= 0 else 'S'}{abs(lat):02d}_{'E' if lon >= 0 else 'W'}{abs(lon):03d}" for lon in range(math.floor(west), math.ceil(east)) for lat in range(math.floor(south), math.ceil(north))]
-    s3_base_url = "https://copernicus-dem-30m.s3.eu-central-1.amazonaws.com/"
-    remote_datasets = []
-    for tile in tiles:
-        url = f"{s3_base_url}Copernicus_DSM_COG_10_{tile.split('_')[0]}_00_{tile.split('_')[1]}_00_DEM/Copernicus_DSM_COG_10_{tile.split('_')[0]}_00_{tile.split('_')[1]}_00_DEM.tif"
-        try:
-            if requests.head(url).status_code == 200: remote_datasets.append(rasterio.open(url))
-        except requests.exceptions.RequestException: continue
-    if not remote_datasets:
+    cache = cache or DEMTileCache(logger=logger)
+    tile_paths = [path for path in (cache.get(tile) for tile in tiles) if path]
+    if not tile_paths:
         logger.error("No valid DEM tiles found on AWS S3.")
         return None
-    logger.info(f"Merging and clipping {len(remote_datasets)} remote tile(s)...")
-    merged_data, merged_transform = rasterio.merge.merge(remote_datasets, bounds=bounds, precision=7)
-    profile = remote_datasets[0].profile
-    profile.update({"height": merged_data.shape[1], "width": merged_data.shape[2], "transform": merged_transform, "driver": "GTiff", "compress": "lzw"})
-    for ds in remote_datasets: ds.close()
+    logger.info(f"Extracting AOI window from {len(tile_paths)} tile(s)...")
+    merged_data, merged_transform, profile = extract_aoi_dem(tile_paths, bounds)
     os.makedirs(output_dir, exist_ok=True)
-    output_filepath = os.path.join(output_dir, "dem_slope.tif")
-    logger.info(f"Saving final clipped DEM to: {output_filepath}")
-    with rasterio.open(output_filepath, "w", **profile) as dst:
+    dem_filepath = os.path.join(output_dir, "dem.tif")
+    logger.info(f"Saving final clipped DEM to: {dem_filepath}")
+    with rasterio.open(dem_filepath, "w", **profile) as dst:
         dst.write(merged_data)
+    # The ML pipeline consumes slope in degrees, not raw elevation
+    output_filepath = write_slope_geotiff(
+        dem_filepath, os.path.join(output_dir, "dem_slope.tif"), aspect_path=os.path.join(output_dir, "dem_aspect.tif")
+    )
     return output_filepath if os.path.exists(output_filepath) else None
 
 def main():
@@ -204,23 +254,33 @@ def main():
         'START_DATE': '2024-07-20T00:00:00Z',
         'END_DATE': '2024-08-01T23:59:59Z',
         'SAR_DOWNLOAD_DIR': './SAR_DATA', 'DEM_DOWNLOAD_DIR': './DEM_DATA',
-        'POLARIZATIONS': ['VV', 'VH'], 'DOWNLOAD_DEM': True, 'DOWNLOAD_SAR': True
+        'POLARIZATIONS': ['VV', 'VH'], 'DOWNLOAD_DEM': True, 'DOWNLOAD_SAR': True,
+        'MAX_PARALLEL_DOWNLOADS': 4, 'MAX_RETRIES': 3,
+        'DEM_CACHE_DIR': './DEM_CACHE', 'DEM_CACHE_MAX_BYTES': 2 * 1024**3
     }
     logger.info(f"Area of Interest: {config['WKT']}")
     logger.info(f"Date Range: {config['START_DATE']} to {config['END_DATE']}")
     try:
-        if config['DOWNLOAD_SAR']:
-            logger.info("\n📡 Starting SAR data acquisition...")
-            download_sar_geotiffs(
-                wkt_aoi=config['WKT'], start_date=config['START_DATE'], end_date=config['END_DATE'],
-                polarizations=config['POLARIZATIONS'], download_dir=config['SAR_DOWNLOAD_DIR']
-            )
-        if config['DOWNLOAD_DEM']:
-            logger.info("\n🗻 Starting DEM data acquisition...")
-            dem_filepath = os.path.join(config['DEM_DOWNLOAD_DIR'], "dem_slope.tif")
-            if os.path.exists(dem_filepath):
-                logger.info(f"Replacing existing DEM file: {dem_filepath}")
-            download_dem_from_aws(wkt_aoi=config['WKT'], output_dir=config['DEM_DOWNLOAD_DIR'])
+        # SAR and DEM acquisition are independent, so they run side by side
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            acquisitions = []
+            if config['DOWNLOAD_SAR']:
+                logger.info("\n📡 Starting SAR data acquisition...")
+                acquisitions.append(pool.submit(
+                    download_sar_geotiffs,
+                    wkt_aoi=config['WKT'], start_date=config['START_DATE'], end_date=config['END_DATE'],
+                    polarizations=config['POLARIZATIONS'], download_dir=config['SAR_DOWNLOAD_DIR'],
+                    max_workers=config['MAX_PARALLEL_DOWNLOADS'], max_retries=config['MAX_RETRIES']
+                ))
+            if config['DOWNLOAD_DEM']:
+                logger.info("\n🗻 Starting DEM data acquisition...")
+                dem_filepath = os.path.join(config['DEM_DOWNLOAD_DIR'], "dem_slope.tif")
+                if os.path.exists(dem_filepath):
+                    logger.info(f"Replacing existing DEM slope file: {dem_filepath}")
+                dem_cache = DEMTileCache(config['DEM_CACHE_DIR'], max_bytes=config['DEM_CACHE_MAX_BYTES'], logger=logger)
+                acquisitions.append(pool.submit(download_dem_from_aws, wkt_aoi=config['WKT'], output_dir=config['DEM_DOWNLOAD_DIR'], cache=dem_cache))
+            for acquisition in acquisitions:
+                acquisition.result()
         logger.info("\n" + "=" * 60)
         logger.info("🎉 DATA ACQUISITION COMPLETE")
         return 0
@@ -0,0 +1,105 @@
+# terrain.py - Slope and aspect derivation from a DEM, processed in tiles
+
+import math
+import logging
+from typing import Optional, Tuple
+
+import numpy as np
+import rasterio
+from rasterio.windows import Window
+
+# Approximate length of one degree of latitude / of longitude at the equator, in metres
+METERS_PER_DEGREE_LAT = 110574.0
+METERS_PER_DEGREE_LON = 111320.0
+
+
+def horn_slope_aspect(dem: np.ndarray, xres: np.ndarray | float, yres: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Computes slope and aspect in degrees with Horn's 3x3 finite-difference kernel.
+
+    `dem` must carry a one-pixel halo on every side; the result is two pixels smaller in
+    each dimension. `xres` may be a per-row column vector (geographic grids, where the
+    ground width of a pixel shrinks with latitude). Aspect is the compass direction of
+    steepest descent, clockwise from north, and -1 on flat ground.
+    """
+    dem = dem.astype(np.float32, copy=False)
+    a, b, c = dem[:-2, :-2], dem[:-2, 1:-1], dem[:-2, 2:]
+    d, f = dem[1:-1, :-2], dem[1:-1, 2:]
+    g, h, i = dem[2:, :-2], dem[2:, 1:-1], dem[2:, 2:]
+
+    # Rows run north to south, so dz_dy is the gradient towards the south
+    dz_dx = ((c + 2 * f + i) - (a + 2 * d + g)) / (8 * xres)
+    dz_dy = ((g + 2 * h + i) - (a + 2 * b + c)) / (8 * yres)
+
+    slope = np.degrees(np.arctan(np.hypot(dz_dx, dz_dy))).astype(np.float32)
+    aspect = np.degrees(np.arctan2(-dz_dx, dz_dy)).astype(np.float32)
+    aspect %= 360
+    aspect[(dz_dx == 0) & (dz_dy == 0)] = -1
+    return slope, aspect
+
+
+def _pixel_spacing_m(src, row_start: int, row_stop: int) -> Tuple[np.ndarray | float, float]:
+    """Returns the ground pixel width (per row) and height in metres for rows [row_start, row_stop)."""
+    xres, yres = src.res
+    if src.crs is None or not src.crs.is_geographic:
+        return xres, yres
+    rows = np.arange(row_start, row_stop) + 0.5
+    latitudes = src.transform.f + rows * src.transform.e
+    xres_m = xres * METERS_PER_DEGREE_LON * np.cos(np.radians(latitudes))
+    return xres_m[:, np.newaxis].astype(np.float32), yres * METERS_PER_DEGREE_LAT
+
+
+def write_slope_geotiff(dem_path: str, slope_path: str, aspect_path: Optional[str] = None, tile_size: int = 1024) -> str:
+    """
+    Derives degree slope (and optionally aspect) from a DEM and writes tiled, compressed GeoTIFFs.
+
+    The DEM is processed in tile_size blocks read with a one-pixel halo, so memory stays
+    bounded by the tile size. Pixel spacing comes from the DEM's geotransform, converted
+    from degrees to metres per row for geographic CRSs. Image borders replicate the edge
+    pixels; DEM nodata becomes NaN in the outputs.
+    """
+    logger = logging.getLogger('SAR_Processor')
+    tile_size = max(256, (tile_size // 256) * 256)  # Whole output blocks per tile
+
+    with rasterio.open(dem_path) as src:
+        profile = src.profile
+        profile.update({
+            "driver": "GTiff", "dtype": "float32", "count": 1, "nodata": np.nan,
+            "tiled": True, "blockxsize": 256, "blockysize": 256,
+            "compress": "deflate", "predictor": 3,
+        })
+        outputs = [rasterio.open(slope_path, "w", **profile)]
+        if aspect_path:
+            outputs.append(rasterio.open(aspect_path, "w", **profile))
+
+        logger.info(f"Computing slope from {dem_path} in {math.ceil(src.height / tile_size) * math.ceil(src.width / tile_size)} tile(s)...")
+        try:
+            for row in range(0, src.height, tile_size):
+                for col in range(0, src.width, tile_size):
+                    height = min(tile_size, src.height - row)
+                    width = min(tile_size, src.width - col)
+
+                    # Read the tile plus a one-pixel halo where the image has one
+                    row_start, col_start = max(0, row - 1), max(0, col - 1)
+                    row_stop, col_stop = min(src.height, row + height + 1), min(src.width, col + width + 1)
+                    dem = src.read(1, window=Window(col_start, row_start, col_stop - col_start, row_stop - row_start), masked=True)
+                    dem = dem.astype(np.float32).filled(np.nan)
+
+                    # Replicate edge pixels only at true image borders
+                    pad = ((row - row_start == 0) * 1, (row_stop - (row + height) == 0) * 1)
+                    pad_cols = ((col - col_start == 0) * 1, (col_stop - (col + width) == 0) * 1)
+                    dem = np.pad(dem, (pad, pad_cols), mode='edge')
+
+                    xres_m, yres_m = _pixel_spacing_m(src, row, row + height)
+                    slope, aspect = horn_slope_aspect(dem, xres_m, yres_m)
+
+                    window = Window(col, row, width, height)
+                    outputs[0].write(slope, 1, window=window)
+                    if aspect_path:
+                        outputs[1].write(aspect, 1, window=window)
+        finally:
+            for dst in outputs:
+                dst.close()
+
+    logger.info(f"Slope written to: {slope_path}")
+    return slope_path
@@ -0,0 +1,61 @@
+# config.py - Runtime settings for the ML service, overridable through environment variables
+
+import os
+
+# --- Model ---
+# Default model file; replace it atomically (os.replace) to roll out a new model without a restart
+MODEL_PATH = os.getenv('ML_MODEL_PATH', 'himalayan_sentinel_model.json')
+# Loaded model versions kept in memory, including the default
+MODEL_CACHE_SIZE = int(os.getenv('ML_MODEL_CACHE_SIZE', '4'))
+# Per-pixel scoring: 'xgboost' (Booster.inplace_predict) or 'numpy' (compiled tree evaluator)
+INFERENCE_BACKEND = os.getenv('ML_INFERENCE_BACKEND', 'xgboost')
+
+# --- Background analysis jobs ---
+# Jobs executing at once; each one runs the full feature + inference pipeline
+JOB_WORKERS = int(os.getenv('ML_JOB_WORKERS', '2'))
+# Jobs allowed to wait for a worker before POST /jobs answers 429
+JOB_QUEUE_DEPTH = int(os.getenv('ML_JOB_QUEUE_DEPTH', '16'))
+# Finished jobs kept for status polling before the oldest are forgotten
+JOB_HISTORY_LIMIT = int(os.getenv('ML_JOB_HISTORY_LIMIT', '256'))
+
+# --- Feature cache ---
+# Directory of memory-mapped feature cubes keyed by input raster identity and parameters
+FEATURE_CACHE_DIR = os.getenv('ML_FEATURE_CACHE_DIR', 'feature_cache')
+# Total size of cached cubes before least recently used entries are evicted (0 disables the cache)
+FEATURE_CACHE_MAX_BYTES = int(os.getenv('ML_FEATURE_CACHE_MAX_BYTES', str(5 * 1024**3)))
+# Hash file contents instead of only path, size and mtime (slower, but survives copies and touches)
+FEATURE_CACHE_CONTENT_DIGEST = os.getenv('ML_FEATURE_CACHE_CONTENT_DIGEST', 'false').lower() == 'true'
+
+# --- Feature pipeline ---
+# Threads used for tiled work inside one analysis (correlation tiles, warping blocks)
+PIPELINE_WORKERS = int(os.getenv('ML_PIPELINE_WORKERS', str(os.cpu_count() or 1)))
+# Inputs on a different grid than vv_before are warped onto it and kept here for reuse
+COREGISTRATION_CACHE_DIR = os.getenv('ML_COREGISTRATION_CACHE_DIR', os.path.join(FEATURE_CACHE_DIR, 'coregistered'))
+COREGISTRATION_CACHE_MAX_BYTES = int(os.getenv('ML_COREGISTRATION_CACHE_MAX_BYTES', str(5 * 1024**3)))
+# Measure the sub-pixel shift of vv_after against vv_before and resample the post-event pair onto it
+SUBPIXEL_REGISTRATION = os.getenv('ML_SUBPIXEL_REGISTRATION', 'true').lower() == 'true'
+# Polynomial degree of the fitted shift field (0: constant shift, 1: affine, 2: quadratic)
+REGISTRATION_DEGREE = int(os.getenv('ML_REGISTRATION_DEGREE', '1'))
+# Speckle filter applied to the SAR bands before features: lee, frost, gamma_map or none (same
+# keys as the data service's SARProcessingConfig). Must match the filter the served model was
+# trained with; the shipped himalayan_sentinel_model.json was trained on unfiltered features.
+SPECKLE_FILTER = os.getenv('ML_SPECKLE_FILTER', 'none').lower()
+FILTER_WINDOW_SIZE = int(os.getenv('ML_FILTER_WINDOW_SIZE', '5'))
+
+# --- Hotspot extraction ---
+# Minimum risk score for a pixel to belong to a hotspot region
+HOTSPOT_THRESHOLD = float(os.getenv('ML_HOTSPOT_THRESHOLD', '0.5'))
+# Number of ranked regions returned per analysis
+HOTSPOT_TOP_K = int(os.getenv('ML_HOTSPOT_TOP_K', '5'))
+
+# --- Heatmap encoding ---
+# Edge length of heatmap PNG tiles; the inline overview is at most this size
+HEATMAP_TILE_SIZE = int(os.getenv('ML_HEATMAP_TILE_SIZE', '256'))
+# Largest compressed hotspot mask inlined in a response; bigger masks are fetched from /jobs/{id}/hotspot_mask.png
+HEATMAP_MASK_INLINE_MAX_BYTES = int(os.getenv('ML_HEATMAP_MASK_INLINE_MAX_BYTES', str(64 * 1024)))
+
+# --- Map tiles ---
+# Rendered XYZ tiles kept in memory, across all jobs
+TILE_CACHE_SIZE = int(os.getenv('ML_TILE_CACHE_SIZE', '2048'))
+# Completed jobs whose risk rasters stay available to GET /tiles
+TILE_RASTER_LIMIT = int(os.getenv('ML_TILE_RASTER_LIMIT', '8'))
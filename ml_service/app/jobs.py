@@ -0,0 +1,82 @@
+# jobs.py - Bounded background execution for analysis requests
+
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable
+
+
+class QueueFullError(Exception):
+    """Raised when every worker is busy and the wait queue is at capacity."""
+
+
+class JobManager:
+    """
+    Runs jobs on a fixed-size worker pool with a bounded wait queue.
+
+    Submissions beyond `workers + queue_depth` outstanding jobs are rejected instead of
+    piling up, so callers can apply backpressure (HTTP 429) rather than time out.
+    """
+
+    def __init__(self, run_job: Callable[[str, dict], dict], workers: int = 2, queue_depth: int = 16, history_limit: int = 256):
+        self.run_job = run_job
+        self.capacity = workers + queue_depth
+        self.history_limit = history_limit
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='analysis-job')
+        self._jobs: OrderedDict[str, dict] = OrderedDict()
+        self._outstanding = 0
+        self._lock = threading.Lock()
+
+    def submit(self, payload: dict) -> str:
+        """Queues a job and returns its id, or raises QueueFullError when at capacity."""
+        with self._lock:
+            if self._outstanding >= self.capacity:
+                raise QueueFullError(f"Analysis queue is full ({self.capacity} jobs outstanding).")
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                'job_id': job_id,
+                'status': 'queued',
+                'result': None,
+                'error': None,
+                'created_at': datetime.now(timezone.utc),
+                'started_at': None,
+                'finished_at': None,
+            }
+            self._outstanding += 1
+        self._executor.submit(self._run, job_id, payload)
+        return job_id
+
+    def get(self, job_id: str) -> dict | None:
+        """Returns a snapshot of the job record, or None for unknown (or expired) ids."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+
+    def _run(self, job_id: str, payload: dict) -> None:
+        self._update(job_id, status='running', started_at=datetime.now(timezone.utc))
+        try:
+            result: Any = self.run_job(job_id, payload)
+        except Exception as e:
+            self._finish(job_id, status='failed', error=str(e))
+        else:
+            self._finish(job_id, status='completed', result=result)
+
+    def _update(self, job_id: str, **fields) -> None:
+        with self._lock:
+            self._jobs[job_id].update(fields)
+
+    def _finish(self, job_id: str, **fields) -> None:
+        with self._lock:
+            self._jobs[job_id].update(fields, finished_at=datetime.now(timezone.utc))
+            self._outstanding -= 1
+            self._evict_finished()
+
+    def _evict_finished(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job['finished_at'] is not None]
+        for job_id in finished[:max(0, len(finished) - self.history_limit)]:
+            del self._jobs[job_id]
@@ -0,0 +1,54 @@
+import math
+
+import numpy as np
+from rasterio.features import geometry_mask
+from rasterio.warp import transform_geom
+from rasterio.windows import Window, from_bounds
+from shapely import wkt as shapely_wkt
+from shapely.errors import ShapelyError
+from shapely.geometry import mapping, shape
+
+# AOIs arrive as WKT in geographic coordinates, like the backend's area_coordinates
+AOI_CRS = 'EPSG:4326'
+
+
+class AOIError(ValueError):
+    """Raised for an AOI that cannot be parsed or does not overlap the analysis rasters."""
+
+
+def parse_aoi_wkt(aoi_wkt: str) -> dict:
+    """Parses a WKT polygon (longitude/latitude) into a GeoJSON-like geometry mapping."""
+    try:
+        geometry = shapely_wkt.loads(aoi_wkt)
+    except (ShapelyError, TypeError, ValueError) as e:
+        raise AOIError(f"Invalid AOI WKT: {e}") from e
+    if geometry.is_empty or geometry.geom_type not in ('Polygon', 'MultiPolygon'):
+        raise AOIError(f"The AOI must be a non-empty Polygon or MultiPolygon, got {geometry.geom_type}.")
+    return mapping(geometry)
+
+
+def aoi_to_crs(geometry: dict, crs, src_crs=AOI_CRS) -> dict:
+    """Reprojects an AOI geometry mapping into the analysis grid's CRS."""
+    return transform_geom(src_crs, crs, geometry)
+
+
+def aoi_window(geometry: dict, transform, grid_shape: tuple[int, int], halo: int = 0) -> Window:
+    """
+    Returns the pixel window bounding an AOI on a grid, grown by `halo` pixels and clipped.
+
+    The halo gives pixels near the AOI edge real neighbours for windowed features.
+    """
+    west, south, east, north = shape(geometry).bounds
+    window = from_bounds(west, south, east, north, transform=transform)
+    row_start = max(0, math.floor(min(window.row_off, window.row_off + window.height)) - halo)
+    col_start = max(0, math.floor(min(window.col_off, window.col_off + window.width)) - halo)
+    row_stop = min(grid_shape[0], math.ceil(max(window.row_off, window.row_off + window.height)) + halo)
+    col_stop = min(grid_shape[1], math.ceil(max(window.col_off, window.col_off + window.width)) + halo)
+    if row_stop <= row_start or col_stop <= col_start:
+        raise AOIError("The AOI does not overlap the input rasters.")
+    return Window(col_start, row_start, col_stop - col_start, row_stop - row_start)
+
+
+def aoi_pixel_mask(geometry: dict, grid_shape: tuple[int, int], transform) -> np.ndarray:
+    """Rasterizes an AOI onto a grid: True for pixels whose centre lies inside the polygon."""
+    return geometry_mask([geometry], out_shape=grid_shape, transform=transform, invert=True)
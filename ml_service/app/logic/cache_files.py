@@ -0,0 +1,97 @@
+import os
+import threading
+import time
+from collections import Counter
+
+# One lock for every on-disk cache in the process: eviction and pinning never interleave
+_lock = threading.Lock()
+_pins: Counter[str] = Counter()
+
+
+class CacheLease:
+    """
+    Cache files a running request depends on; evict_lru leaves them alone until release.
+
+    Pin a path before checking that it exists: from then on no eviction can remove it, and a
+    file evicted just before the pin is simply seen as missing and rebuilt.
+    """
+
+    def __init__(self):
+        self.paths: list[str] = []
+
+    def pin(self, path: str) -> str:
+        path = os.path.abspath(path)
+        with _lock:
+            _pins[path] += 1
+        self.paths.append(path)
+        return path
+
+    def release(self) -> None:
+        with _lock:
+            for path in self.paths:
+                _pins[path] -= 1
+                if _pins[path] <= 0:
+                    del _pins[path]
+        self.paths = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+def touch(path: str) -> None:
+    """
+    Marks a cache file as recently used by advancing its access time.
+
+    The mtime is left alone: cached files are inputs to other caches, whose keys hash their
+    size and mtime, so touching it would invalidate everything derived from the file.
+    """
+    stat = os.stat(path)
+    os.utime(path, ns=(time.time_ns(), stat.st_mtime_ns))
+
+
+def evict_lru(cache_dir: str, max_bytes: int, keep=()) -> None:
+    """
+    Removes the least recently used entries of a cache directory until it fits in max_bytes.
+
+    An entry is every file sharing a name stem (the key before the first '.'), so sidecars
+    and derived files are counted and removed with it; its age is the newest access or
+    modification time among its files (see touch).
+    In-progress '.partial.' files are ignored, and entries holding a path in `keep` or one
+    pinned by a CacheLease are never removed.
+    """
+    with _lock:
+        entries: dict[str, list] = {}
+        for name in os.listdir(cache_dir):
+            path = os.path.join(cache_dir, name)
+            if '.partial.' in name:
+                continue
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if not os.path.isfile(path):
+                continue
+            entry = entries.setdefault(name.split('.', 1)[0], [0.0, 0, []])
+            entry[0] = max(entry[0], stat.st_atime, stat.st_mtime)
+            entry[1] += stat.st_size
+            entry[2].append(os.path.abspath(path))
+
+        protected = {os.path.abspath(path) for path in keep} | set(_pins)
+        total = sum(size for _, size, _ in entries.values())
+        for _, size, paths in sorted(entries.values()):
+            if total <= max_bytes:
+                break
+            if protected.intersection(paths):
+                continue
+            try:
+                for path in paths:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+            except PermissionError:
+                # Still memory-mapped by another request on platforms that lock open files
+                continue
+            total -= size
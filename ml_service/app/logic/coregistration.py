@@ -0,0 +1,403 @@
+import hashlib
+import json
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import rasterio
+from rasterio.enums import Resampling
+from rasterio.vrt import WarpedVRT
+from rasterio.windows import Window
+from scipy import ndimage
+from skimage.registration import phase_cross_correlation
+
+from .cache_files import CacheLease, evict_lru, touch
+
+# The grid every other input is warped onto
+REFERENCE_INPUT = 'vv_before_path'
+
+
+def reference_grid(path: str) -> dict:
+    """Describes the target grid (CRS, transform and shape) of a reference raster."""
+    with rasterio.open(path) as src:
+        return {'crs': src.crs, 'transform': src.transform, 'width': src.width, 'height': src.height}
+
+
+def is_on_grid(path: str, grid: dict) -> bool:
+    """True when a raster already shares the grid's CRS, pixel grid and shape."""
+    with rasterio.open(path) as src:
+        return (
+            src.crs == grid['crs'] and src.width == grid['width'] and src.height == grid['height']
+            and src.transform.almost_equals(grid['transform'])
+        )
+
+
+def warp_to_grid(src_path: str, grid: dict, out_path: str, resampling: Resampling = Resampling.bilinear, block_size: int = 1024, workers: int = 1) -> str:
+    """
+    Reprojects and resamples a raster onto `grid`, one output block at a time.
+
+    Each worker reads its blocks through its own WarpedVRT, so only the source pixels under
+    a block are warped and memory is bounded by the block size. The result is a 256x256
+    tiled, compressed float32 GeoTIFF with NaN outside the source footprint.
+    """
+    block_size = max(256, (block_size // 256) * 256)
+    width, height = grid['width'], grid['height']
+    windows = [
+        Window(col, row, min(block_size, width - col), min(block_size, height - row))
+        for row in range(0, height, block_size)
+        for col in range(0, width, block_size)
+    ]
+
+    profile = {
+        'driver': 'GTiff', 'dtype': 'float32', 'count': 1, 'nodata': np.nan,
+        'crs': grid['crs'], 'transform': grid['transform'], 'width': width, 'height': height,
+        'tiled': True, 'blockxsize': 256, 'blockysize': 256, 'compress': 'deflate', 'predictor': 3,
+    }
+    local = threading.local()
+    write_lock = threading.Lock()
+    handles = []
+
+    def open_vrt() -> WarpedVRT:
+        # Dataset handles are not thread-safe, so every worker opens its own
+        if not hasattr(local, 'vrt'):
+            src = rasterio.open(src_path)
+            local.vrt = WarpedVRT(
+                src, crs=grid['crs'], transform=grid['transform'], width=width, height=height,
+                resampling=resampling, src_nodata=src.nodata, nodata=np.nan, dtype='float32'
+            )
+            handles.append((src, local.vrt))
+        return local.vrt
+
+    with rasterio.open(out_path, 'w', **profile) as dst:
+        def warp_block(window: Window) -> None:
+            data = open_vrt().read(1, window=window)
+            with write_lock:
+                dst.write(data, 1, window=window)
+
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+                for future in [pool.submit(warp_block, window) for window in windows]:
+                    future.result()
+        finally:
+            for src, vrt in handles:
+                vrt.close()
+                src.close()
+    return out_path
+
+
+def _coregistration_key(path: str, grid: dict, resampling: Resampling) -> str:
+    stat = os.stat(path)
+    description = {
+        'path': os.path.abspath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+        'crs': str(grid['crs']), 'transform': list(grid['transform'])[:6],
+        'width': grid['width'], 'height': grid['height'], 'resampling': resampling.name,
+    }
+    return hashlib.sha256(json.dumps(description, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def coregister_inputs(file_paths: dict, input_keys, cache_dir: str, max_bytes: int = 5 * 1024**3, reference_key: str = REFERENCE_INPUT, resampling: Resampling = Resampling.bilinear, block_size: int = 1024, workers: int = 1, lease: CacheLease | None = None) -> dict:
+    """
+    Returns a copy of `file_paths` in which every input in `input_keys` lies on the reference grid.
+
+    Inputs already on the grid are passed through untouched; the rest are warped with
+    warp_to_grid into `cache_dir`, named by a hash of the source identity and the grid, so
+    a repeat request reuses the warped rasters. The directory is kept under `max_bytes`;
+    with a `lease`, the warped rasters stay pinned against eviction until it is released.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    grid = reference_grid(file_paths[reference_key])
+    aligned = dict(file_paths)
+    used = set()
+
+    for key in input_keys:
+        path = file_paths.get(key)
+        if not path or key == reference_key or is_on_grid(path, grid):
+            continue
+        out_path = os.path.join(cache_dir, f"{_coregistration_key(path, grid, resampling)}.tif")
+        if lease is not None:
+            lease.pin(out_path)
+        if os.path.exists(out_path):
+            touch(out_path)
+            print(f"Co-registered {key} reused from cache.")
+        else:
+            print(f"Co-registering {key} onto the {grid['width']}x{grid['height']} reference grid...")
+            staging_path = out_path.replace('.tif', f".{uuid.uuid4().hex}.partial.tif")
+            warp_to_grid(path, grid, staging_path, resampling=resampling, block_size=block_size, workers=workers)
+            os.replace(staging_path, out_path)
+        aligned[key] = out_path
+        used.add(out_path)
+
+    evict_lru(cache_dir, max_bytes, keep=used)
+    return aligned
+
+
+# --- Sub-pixel registration of the post-event pair ---
+
+# Inputs resampled onto the sub-pixel shift field estimated between vv_before and vv_after
+SHIFTED_INPUTS = ('vv_after_path', 'vh_after_path')
+
+# Weakest normalised cross-correlation peak at which a tile's shift is trusted
+MIN_TILE_PEAK = 0.4
+# Largest residual shift, in pixels, plausible after the inputs share a grid
+MAX_SUBPIXEL_SHIFT = 3.0
+
+
+def _shift_tile_windows(height: int, width: int, tile_size: int, tiles_per_axis: int) -> list[Window]:
+    """Up to tiles_per_axis**2 tiles spread evenly over the grid."""
+    tile_size = min(tile_size, height, width)
+    rows = np.unique(np.linspace(0, height - tile_size, tiles_per_axis).round().astype(int))
+    cols = np.unique(np.linspace(0, width - tile_size, tiles_per_axis).round().astype(int))
+    return [Window(int(col), int(row), tile_size, tile_size) for row in rows for col in cols]
+
+
+def _prepare_shift_tile(tile: np.ndarray, taper: np.ndarray, max_nodata: float) -> np.ndarray | None:
+    """dB, zero-mean, Hann-tapered tile for phase correlation; None when mostly nodata or flat."""
+    valid = np.isfinite(tile) & (tile > 0)
+    if valid.mean() < 1 - max_nodata:
+        return None
+    tile_db = np.zeros(tile.shape, dtype=np.float32)
+    np.log10(tile, out=tile_db, where=valid)
+    tile_db *= 10
+    tile_db[~valid] = np.median(tile_db[valid])
+    tile_db -= tile_db.mean()
+    if not tile_db.any():
+        return None
+    return tile_db * taper
+
+
+def estimate_tile_shifts(reference_path: str, moving_path: str, tile_size: int = 256, tiles_per_axis: int = 8,
+                         upsample_factor: int = 20, max_nodata: float = 0.1, min_peak: float = MIN_TILE_PEAK,
+                         max_shift: float = MAX_SUBPIXEL_SHIFT, workers: int = 1) -> np.ndarray:
+    """
+    Measures the sub-pixel offset of `moving_path` against `reference_path` on a grid of tiles.
+
+    Tiles are compared in dB, Hann-tapered, by FFT cross-correlation refined to
+    1/upsample_factor pixel (matrix-multiply DFT upsampling), in parallel. Returns an
+    (n, 5) array of (tile centre row, tile centre col, row shift, col shift, peak); a shift
+    is what must be added to moving coordinates to land on the reference, and the peak is
+    the normalised correlation at it. Tiles with more than `max_nodata` nodata pixels, a
+    peak under `min_peak` (featureless or decorrelated ground, where the shift is noise)
+    or a shift over `max_shift` pixels are dropped.
+    """
+    with rasterio.open(reference_path) as reference, rasterio.open(moving_path) as moving:
+        windows = _shift_tile_windows(reference.height, reference.width, tile_size, tiles_per_axis)
+        pairs = [
+            (window, reference.read(1, window=window, masked=True).filled(np.nan).astype(np.float32),
+             moving.read(1, window=window, masked=True).filled(np.nan).astype(np.float32))
+            for window in windows
+        ]
+    taper = np.outer(np.hanning(windows[0].height), np.hanning(windows[0].width)).astype(np.float32)
+
+    def measure(window: Window, reference_tile: np.ndarray, moving_tile: np.ndarray):
+        reference_tile = _prepare_shift_tile(reference_tile, taper, max_nodata)
+        moving_tile = _prepare_shift_tile(moving_tile, taper, max_nodata)
+        if reference_tile is None or moving_tile is None:
+            return None
+        # Plain (unwhitened) cross-correlation: on tapered speckled tiles it is less biased than phase-only
+        shift, error, _ = phase_cross_correlation(reference_tile, moving_tile, upsample_factor=upsample_factor, normalization=None)
+        # error = sqrt(1 - peak^2), with peak the normalised cross-correlation at the shift
+        peak = float(np.sqrt(max(0.0, 1.0 - error * error)))
+        if peak < min_peak or np.hypot(*shift) > max_shift:
+            return None
+        centre = (window.row_off + window.height / 2, window.col_off + window.width / 2)
+        return (*centre, *shift, peak)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        measured = [result for result in pool.map(lambda pair: measure(*pair), pairs) if result is not None]
+    return np.asarray(measured, dtype=np.float64).reshape(-1, 5)
+
+
+def _polynomial_terms(rows: np.ndarray, cols: np.ndarray, shape: tuple[int, int], degree: int) -> np.ndarray:
+    """Polynomial design matrix in coordinates scaled to [-1, 1], for a well-conditioned fit."""
+    y = 2 * np.asarray(rows, dtype=np.float64) / max(shape[0] - 1, 1) - 1
+    x = 2 * np.asarray(cols, dtype=np.float64) / max(shape[1] - 1, 1) - 1
+    return np.stack([x ** i * y ** j for i in range(degree + 1) for j in range(degree + 1 - i)], axis=-1)
+
+
+def fit_shift_field(tile_shifts: np.ndarray, shape: tuple[int, int], degree: int = 1, max_iterations: int = 5,
+                    upsample_factor: int = 20) -> dict | None:
+    """
+    Fits a smooth polynomial shift field (row and col shift over the grid) to tile shifts.
+
+    Tiles further than three robust standard deviations from the fit are dropped and the fit
+    is repeated, so tiles over changed terrain do not drag the field. The spread is never
+    taken below the 1/upsample_factor quantum the shifts were measured in, otherwise tiles
+    that agree exactly would reject their neighbours one quantum away. The degree is lowered
+    when there are too few tiles for it; None is returned when no tile was measured.
+    """
+    if len(tile_shifts) == 0:
+        return None
+    while degree > 0 and len(tile_shifts) < 2 * (degree + 1) * (degree + 2) // 2:
+        degree -= 1
+    design = _polynomial_terms(tile_shifts[:, 0], tile_shifts[:, 1], shape, degree)
+    shifts = tile_shifts[:, 2:4]
+    inliers = np.ones(len(tile_shifts), dtype=bool)
+    for _ in range(max_iterations):
+        coefficients = np.linalg.lstsq(design[inliers], shifts[inliers], rcond=None)[0]
+        residual = np.hypot(*(shifts - design @ coefficients).T)
+        spread = max(1.4826 * np.median(residual[inliers]), 1.0 / upsample_factor)
+        updated = residual <= 3 * spread
+        if updated.sum() < design.shape[1] or np.array_equal(updated, inliers):
+            break
+        inliers = updated
+    return {
+        'degree': degree, 'shape': list(shape), 'coefficients': coefficients.tolist(),
+        'tiles': int(len(tile_shifts)), 'inliers': int(inliers.sum()),
+        'rms_residual': float(np.sqrt(np.mean(residual[inliers] ** 2))),
+    }
+
+
+def evaluate_shift_field(field: dict, rows: np.ndarray, cols: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Returns the (row shift, col shift) of a fitted field at the given pixel coordinates."""
+    shifts = _polynomial_terms(rows, cols, tuple(field['shape']), field['degree']) @ np.asarray(field['coefficients'])
+    return shifts[..., 0], shifts[..., 1]
+
+
+def resample_shifted(src_path: str, field: dict, out_path: str, block_size: int = 1024, workers: int = 1) -> str:
+    """
+    Resamples a raster through a fitted shift field in a single bilinear pass, block by block.
+
+    Each output block reads only the source window its shifted coordinates fall in (plus a
+    one-pixel margin) and interpolates it with map_coordinates. Samples that fall just
+    outside the source take the nearest edge pixel rather than becoming nodata. The output
+    keeps the source grid.
+    """
+    block_size = max(256, (block_size // 256) * 256)
+    local = threading.local()
+    write_lock = threading.Lock()
+    handles = []
+
+    with rasterio.open(src_path) as src:
+        height, width = src.height, src.width
+        profile = {
+            'driver': 'GTiff', 'dtype': 'float32', 'count': 1, 'nodata': np.nan,
+            'crs': src.crs, 'transform': src.transform, 'width': width, 'height': height,
+            'tiled': True, 'blockxsize': 256, 'blockysize': 256, 'compress': 'deflate', 'predictor': 3,
+        }
+    windows = [
+        Window(col, row, min(block_size, width - col), min(block_size, height - row))
+        for row in range(0, height, block_size)
+        for col in range(0, width, block_size)
+    ]
+
+    def open_source():
+        # Dataset handles are not thread-safe, so every worker opens its own
+        if not hasattr(local, 'src'):
+            local.src = rasterio.open(src_path)
+            handles.append(local.src)
+        return local.src
+
+    with rasterio.open(out_path, 'w', **profile) as dst:
+        def resample_block(window: Window) -> None:
+            rows, cols = np.mgrid[window.row_off:window.row_off + window.height, window.col_off:window.col_off + window.width]
+            row_shift, col_shift = evaluate_shift_field(field, rows, cols)
+            src_rows, src_cols = rows - row_shift, cols - col_shift
+            row_start = int(np.clip(np.floor(src_rows.min()) - 1, 0, height - 1))
+            col_start = int(np.clip(np.floor(src_cols.min()) - 1, 0, width - 1))
+            row_stop = int(np.clip(np.ceil(src_rows.max()) + 2, row_start + 1, height))
+            col_stop = int(np.clip(np.ceil(src_cols.max()) + 2, col_start + 1, width))
+            source = open_source().read(
+                1, window=Window(col_start, row_start, col_stop - col_start, row_stop - row_start), masked=True
+            ).filled(np.nan).astype(np.float32)
+            data = ndimage.map_coordinates(
+                source, [src_rows - row_start, src_cols - col_start], order=1, mode='nearest', prefilter=False
+            ).astype(np.float32)
+            with write_lock:
+                dst.write(data, 1, window=window)
+
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+                for future in [pool.submit(resample_block, window) for window in windows]:
+                    future.result()
+        finally:
+            for handle in handles:
+                handle.close()
+    return out_path
+
+
+def register_subpixel(file_paths: dict, cache_dir: str, reference_key: str = REFERENCE_INPUT, shifted_keys=SHIFTED_INPUTS,
+                      degree: int = 1, min_shift: float = 0.05, max_shift: float = MAX_SUBPIXEL_SHIFT,
+                      min_tiles: int = 6, min_inlier_fraction: float = 0.6, max_residual: float = 0.3,
+                      tile_size: int = 256, tiles_per_axis: int = 8, block_size: int = 1024, workers: int = 1,
+                      max_bytes: int = 5 * 1024**3, lease: CacheLease | None = None) -> dict:
+    """
+    Returns a copy of `file_paths` whose post-event inputs are registered to vv_before at sub-pixel level.
+
+    Tile shifts between `reference_key` and the first of `shifted_keys` are measured with
+    estimate_tile_shifts and fitted with fit_shift_field; every input in `shifted_keys` is
+    then resampled through that field once. All inputs must already share the reference
+    grid (see coregister_inputs).
+
+    The inputs are passed through untouched when the field stays under `min_shift` pixels
+    everywhere, and also when the measurement is not trustworthy: fewer than `min_tiles`
+    tiles with a clear correlation peak, fewer than `min_inlier_fraction` of them agreeing
+    with the fit, an RMS residual over `max_residual` pixels, or a field reaching beyond
+    `max_shift` pixels. Registered rasters are cached in `cache_dir`
+    by a hash of the source rasters and the parameters, counted against the same
+    `max_bytes` budget and pinned by `lease` like coregister_inputs' outputs.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    reference_path, measured_path = file_paths[reference_key], file_paths[shifted_keys[0]]
+    grid = reference_grid(reference_path)
+    parameters = {'degree': degree, 'tile_size': tile_size, 'tiles_per_axis': tiles_per_axis, 'max_shift': max_shift}
+    sources = [_coregistration_key(path, grid, Resampling.bilinear) for path in (reference_path, measured_path)]
+    pair_key = hashlib.sha256(json.dumps([*sources, parameters]).encode('utf-8')).hexdigest()
+
+    field_path = os.path.join(cache_dir, f"{pair_key}.shift.json")
+    if lease is not None:
+        lease.pin(field_path)
+    if os.path.exists(field_path):
+        with open(field_path) as f:
+            field = json.load(f)
+    else:
+        tile_shifts = estimate_tile_shifts(
+            reference_path, measured_path, tile_size=tile_size, tiles_per_axis=tiles_per_axis,
+            max_shift=max_shift, workers=workers
+        )
+        field = fit_shift_field(tile_shifts, (grid['height'], grid['width']), degree=degree)
+        # Concurrent jobs may read the field, so it is published atomically like the rasters
+        staging_path = field_path.replace('.shift.json', f".{uuid.uuid4().hex}.partial.json")
+        with open(staging_path, 'w') as f:
+            json.dump(field, f)
+        os.replace(staging_path, field_path)
+
+    if field is None or field['tiles'] < min_tiles:
+        print(f"Sub-pixel registration skipped: {0 if field is None else field['tiles']} tile(s) with a clear correlation peak.")
+        return dict(file_paths)
+    if field['inliers'] < min_inlier_fraction * field['tiles'] or field['rms_residual'] > max_residual:
+        print(f"Sub-pixel registration skipped: inconsistent tile shifts ({field['inliers']}/{field['tiles']} inliers, "
+              f"RMS residual {field['rms_residual']:.3f} px).")
+        return dict(file_paths)
+    sample_rows, sample_cols = np.meshgrid(
+        np.linspace(0, grid['height'] - 1, 16), np.linspace(0, grid['width'] - 1, 16), indexing='ij'
+    )
+    largest = float(np.hypot(*evaluate_shift_field(field, sample_rows, sample_cols)).max())
+    if largest < min_shift:
+        print(f"Post-event images already registered (largest shift {largest:.3f} px).")
+        return dict(file_paths)
+    if largest > max_shift:
+        print(f"Sub-pixel registration skipped: implausible {largest:.2f} px shift field.")
+        return dict(file_paths)
+
+    print(f"Registering post-event images: up to {largest:.2f} px shift, {field['inliers']}/{field['tiles']} tiles, "
+          f"RMS residual {field['rms_residual']:.3f} px.")
+    registered = dict(file_paths)
+    for key in shifted_keys:
+        path = file_paths.get(key)
+        if not path:
+            continue
+        source_key = _coregistration_key(path, grid, Resampling.bilinear)
+        out_path = os.path.join(cache_dir, f"{hashlib.sha256(f'{pair_key}:{source_key}'.encode('utf-8')).hexdigest()}.tif")
+        if lease is not None:
+            lease.pin(out_path)
+        if os.path.exists(out_path):
+            touch(out_path)
+        else:
+            staging_path = out_path.replace('.tif', f".{uuid.uuid4().hex}.partial.tif")
+            resample_shifted(path, field, staging_path, block_size=block_size, workers=workers)
+            os.replace(staging_path, out_path)
+        registered[key] = out_path
+    evict_lru(cache_dir, max_bytes, keep=[field_path, *registered.values()])
+    return registered
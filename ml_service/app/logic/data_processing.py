@@ -1,6 +1,8 @@
 import numpy as np
 import pandas as pd
 
+from .feature_store import FeatureCube
+
 def match_shapes(array1: np.ndarray, array2: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
     """Crops two 2D arrays to the smallest common shape."""
     min_height = min(array1.shape[0], array2.shape[0])
@@ -19,6 +21,17 @@ def assemble_feature_table(slope: np.ndarray, backscatter_change: np.ndarray, co
     }
     return pd.DataFrame(feature_data)
 
+def assemble_feature_cube(slope: np.ndarray, backscatter_change: np.ndarray, correlation: np.ndarray, ratio_change: np.ndarray, path: str | None = None) -> FeatureCube:
+    """Assembles feature arrays into a float32 FeatureCube, memory-mapped to `path` if given."""
+    cube = FeatureCube.create(slope.shape, path=path)
+    rows, cols = slice(None), slice(None)
+    cube.write_block('slope', rows, cols, slope)
+    cube.write_block('backscatter_change', rows, cols, backscatter_change)
+    cube.write_block('correlation', rows, cols, correlation)
+    cube.write_block('ratio_change', rows, cols, ratio_change)
+    cube.flush()
+    return cube
+
 def create_rule_based_labels(correlation: np.ndarray, slope: np.ndarray) -> np.ndarray:
     """Creates a 'answer key' for training based on simple rules."""
     # Rule: a "landslide" is where correlation is low (< 0.3) AND slope is high (> 30)
@@ -0,0 +1,85 @@
+import hashlib
+import json
+import os
+import uuid
+
+from .cache_files import evict_lru, touch
+from .feature_store import FeatureCube
+
+
+def _file_identity(path: str, content_digest: bool = False) -> dict:
+    """Describes an input file by path, size and mtime, plus a SHA-256 of its bytes if requested."""
+    stat = os.stat(path)
+    identity = {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    if content_digest:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        identity['sha256'] = digest.hexdigest()
+    return identity
+
+
+class FeatureCache:
+    """
+    On-disk, content-addressed store of FeatureCubes with LRU eviction under a byte budget.
+
+    Entries are memory-mappable .npy cubes named by a hash of the input rasters' identity
+    and the feature parameters, so a repeat request for the same files skips feature
+    computation entirely.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int, content_digest: bool = False):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.content_digest = content_digest
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def make_key(self, input_paths: dict[str, str], params: dict) -> str:
+        """Hashes the identity of every input raster together with the feature parameters."""
+        description = {
+            'inputs': {name: _file_identity(path, self.content_digest) for name, path in sorted(input_paths.items())},
+            'params': params,
+        }
+        encoded = json.dumps(description, sort_keys=True, default=str).encode('utf-8')
+        return hashlib.sha256(encoded).hexdigest()
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.npy")
+
+    def get(self, key: str) -> FeatureCube | None:
+        """Opens a cached cube read-only and marks it as recently used, or returns None on a miss."""
+        path = self.path_for(key)
+        try:
+            cube = FeatureCube.open(path)
+            touch(path)
+        except FileNotFoundError:
+            return None
+        return cube
+
+    def staging_path(self, key: str) -> str:
+        """Returns a unique temporary path to build a cube at before committing it."""
+        return os.path.join(self.cache_dir, f"{key}.{uuid.uuid4().hex}.partial.npy")
+
+    def discard(self, staging_path: str) -> None:
+        """Removes a cube staged at staging_path, with its sidecars, after its build failed."""
+        for leftover in (staging_path, f"{staging_path}.json", f"{staging_path}.valid.npy"):
+            try:
+                os.remove(leftover)
+            except FileNotFoundError:
+                pass
+
+    def commit(self, key: str, staging_path: str) -> FeatureCube:
+        """Atomically publishes a cube built at staging_path, then enforces the byte budget."""
+        path = self.path_for(key)
+        # The sidecars go first so a visible .npy always has its metadata and validity mask
+        os.replace(f"{staging_path}.json", f"{path}.json")
+        os.replace(f"{staging_path}.valid.npy", f"{path}.valid.npy")
+        os.replace(staging_path, path)
+        cube = FeatureCube.open(path)
+        self.evict(keep=path)
+        return cube
+
+    def evict(self, keep: str | None = None) -> None:
+        """Removes the least recently used entries, other than `keep`, until the cache fits in max_bytes."""
+        evict_lru(self.cache_dir, self.max_bytes, keep=[keep] if keep else ())
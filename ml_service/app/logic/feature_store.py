@@ -0,0 +1,150 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from rasterio.transform import Affine
+
+# Column order the landslide model was trained with
+FEATURE_NAMES = ('slope', 'backscatter_change', 'correlation', 'ratio_change')
+
+
+class FeatureCube:
+    """
+    Columnar float32 feature store backed by one contiguous (n_pixels x n_features) array.
+
+    When created with a path the array is a memory-mapped .npy file with a JSON sidecar,
+    so scenes larger than RAM can be assembled block by block and handed to XGBoost as-is.
+    Blocks of a `block_shape` grid can be marked empty (outside the data footprint), and a
+    per-pixel validity mask (a .valid.npy sidecar next to a memory-mapped cube) records which
+    pixels had every input; invalid pixels are stored as 0 and reported by valid_pixels().
+    """
+
+    def __init__(self, data: np.ndarray, shape: tuple[int, int], feature_names=FEATURE_NAMES, path: str | None = None, transform=None, crs=None, block_shape: tuple[int, int] | None = None, empty_blocks=(), valid: np.ndarray | None = None):
+        if data.shape != (shape[0] * shape[1], len(feature_names)):
+            raise ValueError(f"Feature array {data.shape} does not match raster shape {shape} x {len(feature_names)} features.")
+        self.data = data
+        self.shape = tuple(shape)
+        self.feature_names = tuple(feature_names)
+        self.path = path
+        self.transform = Affine(*transform[:6]) if transform else None
+        self.crs = crs
+        self.block_shape = tuple(block_shape) if block_shape else None
+        self.empty_blocks = {tuple(block) for block in empty_blocks}
+        self.valid = valid
+
+    @classmethod
+    def create(cls, shape: tuple[int, int], feature_names=FEATURE_NAMES, path: str | None = None, transform=None, crs=None, block_shape: tuple[int, int] | None = None) -> "FeatureCube":
+        """Allocates an empty cube, memory-mapped to `path` when one is given."""
+        n_rows = shape[0] * shape[1]
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            data = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=(n_rows, len(feature_names)))
+            valid = np.lib.format.open_memmap(cls._valid_path(path), mode='w+', dtype=bool, shape=(n_rows,))
+        else:
+            data = np.empty((n_rows, len(feature_names)), dtype=np.float32)
+            valid = np.empty(n_rows, dtype=bool)
+        valid[:] = True
+        cube = cls(data, shape, feature_names, path=path, transform=transform, crs=crs, block_shape=block_shape, valid=valid)
+        if path:
+            cube._write_metadata()
+        return cube
+
+    @classmethod
+    def open(cls, path: str, mode: str = 'r') -> "FeatureCube":
+        """Memory-maps an existing cube written by create()."""
+        with open(cls._metadata_path(path)) as f:
+            metadata = json.load(f)
+        data = np.load(path, mmap_mode=mode)
+        valid_path = cls._valid_path(path)
+        valid = np.load(valid_path, mmap_mode=mode) if os.path.exists(valid_path) else None
+        return cls(
+            data, metadata['shape'], metadata['feature_names'], path=path,
+            transform=metadata.get('transform'), crs=metadata.get('crs'),
+            block_shape=metadata.get('block_shape'), empty_blocks=metadata.get('empty_blocks', ()), valid=valid
+        )
+
+    @staticmethod
+    def _metadata_path(path: str) -> str:
+        return f"{path}.json"
+
+    @staticmethod
+    def _valid_path(path: str) -> str:
+        return f"{path}.valid.npy"
+
+    def _write_metadata(self) -> None:
+        metadata = {
+            'shape': list(self.shape),
+            'feature_names': list(self.feature_names),
+            'transform': list(self.transform)[:6] if self.transform else None,
+            'crs': str(self.crs) if self.crs else None,
+            'block_shape': list(self.block_shape) if self.block_shape else None,
+            'empty_blocks': sorted(list(block) for block in self.empty_blocks),
+        }
+        with open(self._metadata_path(self.path), 'w') as f:
+            json.dump(metadata, f)
+
+    @property
+    def n_pixels(self) -> int:
+        return self.data.shape[0]
+
+    @property
+    def n_features(self) -> int:
+        return self.data.shape[1]
+
+    def raster(self, name: str) -> np.ndarray:
+        """Returns a (height, width) view of one feature column; no data is copied."""
+        column = self.feature_names.index(name)
+        return self.data.reshape(self.shape[0], self.shape[1], self.n_features)[:, :, column]
+
+    def write_block(self, name: str, rows: slice, cols: slice, values: np.ndarray) -> None:
+        """Writes one raster block into a feature column, replacing NaNs with 0 as it goes."""
+        target = self.raster(name)[rows, cols]
+        np.copyto(target, values, casting='same_kind')
+        target[np.isnan(target)] = 0
+
+    def valid_raster(self) -> np.ndarray | None:
+        """Returns a (height, width) view of the per-pixel validity mask, or None for cubes without one."""
+        return None if self.valid is None else self.valid.reshape(self.shape)
+
+    def write_valid(self, rows: slice, cols: slice, valid: np.ndarray) -> None:
+        """Records which pixels of a raster block had every input (False = nodata somewhere)."""
+        self.valid_raster()[rows, cols] = valid
+
+    def mark_empty(self, rows: slice, cols: slice) -> None:
+        """Records that the block at (rows, cols) lies outside the data footprint."""
+        self.empty_blocks.add((rows.start // self.block_shape[0], cols.start // self.block_shape[1]))
+        if self.valid is not None:
+            self.write_valid(rows, cols, False)
+
+    def valid_pixels(self, pixels: slice) -> np.ndarray | None:
+        """Boolean mask of the valid pixels in a flat pixel range; None if all of them are valid."""
+        if self.valid is not None:
+            valid = np.asarray(self.valid[pixels])
+            return None if valid.all() else valid
+        if not self.empty_blocks:
+            return None
+        rows, cols = np.divmod(np.arange(pixels.start, pixels.stop), self.shape[1])
+        blocks_per_row = -(-self.shape[1] // self.block_shape[1])
+        empty = np.zeros(-(-self.shape[0] // self.block_shape[0]) * blocks_per_row, dtype=bool)
+        for block_row, block_col in self.empty_blocks:
+            empty[block_row * blocks_per_row + block_col] = True
+        return ~empty[(rows // self.block_shape[0]) * blocks_per_row + cols // self.block_shape[1]]
+
+    def iter_chunks(self, chunk_rows: int = 1_000_000):
+        """Yields (row_slice, chunk) views over consecutive pixel rows, for training or inference."""
+        for start in range(0, self.n_pixels, chunk_rows):
+            rows = slice(start, min(start + chunk_rows, self.n_pixels))
+            yield rows, self.data[rows]
+
+    def flush(self) -> None:
+        if isinstance(self.data, np.memmap):
+            self.data.flush()
+        if isinstance(self.valid, np.memmap):
+            self.valid.flush()
+        if self.path:
+            self._write_metadata()
+
+    def to_frame(self) -> pd.DataFrame:
+        """Copies the cube into a pandas DataFrame, for callers that still expect one."""
+        return pd.DataFrame(np.asarray(self.data), columns=list(self.feature_names))
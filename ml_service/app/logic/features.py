@@ -1,5 +1,6 @@
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
-from skimage.registration import phase_cross_correlation
 from skimage.util import view_as_windows
 
 
@@ -30,55 +31,228 @@ def calculate_vh_vv_ratio(vh_band: np.ndarray, vv_band: np.ndarray) -> np.ndarra
     return ratio
 
 
-def calculate_correlation_map(before_band: np.ndarray, after_band: np.ndarray, window_size: int = 11, tile_size: int = 1024) -> np.ndarray:
+# Layers produced by calculate_sar_features, in the order they are computed
+SAR_FEATURE_LAYERS = ('vv_before_db', 'vv_after_db', 'backscatter_change', 'ratio_before', 'ratio_after', 'ratio_change')
+
+
+def allocate_sar_feature_buffers(shape: tuple[int, int]) -> dict[str, np.ndarray]:
+    """Preallocates the output and scratch buffers used by calculate_sar_features."""
+    buffers = {name: np.empty(shape, dtype=np.float32) for name in SAR_FEATURE_LAYERS}
+    buffers['scratch_mask'] = np.empty(shape, dtype=bool)
+    return buffers
+
+
+def _to_db_into(intensity_array: np.ndarray, out: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    """In-place equivalent of to_db, writing into `out` and using `mask` as scratch."""
+    np.copyto(out, intensity_array, casting='unsafe')
+    np.less_equal(out, 0, out=mask)
+    np.copyto(out, np.float32(1e-10), where=mask)
+    np.log10(out, out=out)
+    np.multiply(out, np.float32(10), out=out)
+    return out
+
+
+def _ratio_into(vh_band: np.ndarray, vv_band: np.ndarray, out: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    """In-place equivalent of calculate_vh_vv_ratio, writing into `out` and using `mask` as scratch."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.divide(vh_band, vv_band, out=out)
+    np.equal(vv_band, 0, out=mask)
+    np.copyto(out, np.float32(np.nan), where=mask)
+    return out
+
+
+def calculate_sar_features(vv_before: np.ndarray, vv_after: np.ndarray, vh_before: np.ndarray, vh_after: np.ndarray, out: dict[str, np.ndarray] | None = None) -> dict[str, np.ndarray]:
+    """
+    Computes the dB layers, backscatter change and VH/VV ratio change in a single pass.
+
+    Each input is read once and every result is written into the preallocated `out`
+    buffers (see allocate_sar_feature_buffers), so repeated calls over blocks allocate
+    nothing. Results match to_db, calculate_backscatter_change and calculate_vh_vv_ratio.
+    """
+    shape = vv_before.shape
+    if not (vv_after.shape == vh_before.shape == vh_after.shape == shape):
+        raise ValueError("Input VV/VH before/after arrays must have the same shape.")
+    if out is None:
+        out = allocate_sar_feature_buffers(shape)
+    mask = out['scratch_mask']
+
+    vv_before = np.asarray(vv_before, dtype=np.float32)
+    vv_after = np.asarray(vv_after, dtype=np.float32)
+    vh_before = np.asarray(vh_before, dtype=np.float32)
+    vh_after = np.asarray(vh_after, dtype=np.float32)
+
+    _to_db_into(vv_before, out['vv_before_db'], mask)
+    _to_db_into(vv_after, out['vv_after_db'], mask)
+    np.subtract(out['vv_after_db'], out['vv_before_db'], out=out['backscatter_change'])
+
+    _ratio_into(vh_before, vv_before, out['ratio_before'], mask)
+    _ratio_into(vh_after, vv_after, out['ratio_after'], mask)
+    np.subtract(out['ratio_after'], out['ratio_before'], out=out['ratio_change'])
+    return out
+
+
+def _box_sum(integral: np.ndarray, window_size: int) -> np.ndarray:
+    """Returns the sum over every window_size x window_size window of a zero-bordered integral image."""
+    w = window_size
+    return integral[w:, w:] - integral[:-w, w:] - integral[w:, :-w] + integral[:-w, :-w]
+
+
+def _integral_image(array: np.ndarray) -> np.ndarray:
+    """Builds a summed-area table with a leading row and column of zeros."""
+    integral = np.zeros((array.shape[0] + 1, array.shape[1] + 1), dtype=np.float64)
+    np.cumsum(array, axis=0, out=integral[1:, 1:])
+    np.cumsum(integral[1:, 1:], axis=1, out=integral[1:, 1:])
+    return integral
+
+
+def _correlation_tile_integral(before_tile_padded: np.ndarray, after_tile_padded: np.ndarray, window_size: int) -> np.ndarray:
+    """
+    Normalized cross-correlation of one padded tile from running sums of x, y, x^2, y^2 and x*y.
+
+    Non-finite (nodata) pixels are zeroed out of the sums and counted separately, so only the
+    windows that contain one come out NaN, as with the sliding-window engine.
+    """
+    valid = np.isfinite(before_tile_padded) & np.isfinite(after_tile_padded)
+    if not valid.any():
+        return np.full((before_tile_padded.shape[0] - window_size + 1, before_tile_padded.shape[1] - window_size + 1), np.nan)
+
+    # Centre on the tile means so the running sums do not lose precision to large offsets
+    x = np.where(valid, before_tile_padded, 0).astype(np.float64)
+    y = np.where(valid, after_tile_padded, 0).astype(np.float64)
+    x[valid] -= x[valid].mean()
+    y[valid] -= y[valid].mean()
+    n = float(window_size * window_size)
+
+    sum_x = _box_sum(_integral_image(x), window_size)
+    sum_y = _box_sum(_integral_image(y), window_size)
+    sum_xx = _box_sum(_integral_image(x * x), window_size)
+    sum_yy = _box_sum(_integral_image(y * y), window_size)
+    sum_xy = _box_sum(_integral_image(x * y), window_size)
+
+    numerator = sum_xy - sum_x * sum_y / n
+    var_x = sum_xx - sum_x * sum_x / n
+    var_y = sum_yy - sum_y * sum_y / n
+
+    # Flat windows have zero variance; cancellation leaves a tiny residue instead of an exact zero
+    eps = np.finfo(np.float64).eps * 64
+    flat = (var_x <= eps * sum_xx) | (var_y <= eps * sum_yy)
+    numerator[flat] = 0
+    denominator = np.sqrt(np.clip(var_x, 0, None) * np.clip(var_y, 0, None))
+    denominator[flat] = 1  # Avoid division by zero
+
+    correlation = np.clip(numerator / denominator, -1, 1)
+    if not valid.all():
+        count = _box_sum(_integral_image(valid.astype(np.float64)), window_size)
+        correlation[count < n - 0.5] = np.nan
+    return correlation
+
+
+def _correlation_tile_windows(before_tile_padded: np.ndarray, after_tile_padded: np.ndarray, window_size: int) -> np.ndarray:
+    """Reference normalized cross-correlation of one padded tile using explicit sliding windows."""
+    # Create sliding windows for the current tile
+    before_windows = view_as_windows(before_tile_padded, (window_size, window_size))
+    after_windows = view_as_windows(after_tile_padded, (window_size, window_size))
+
+    # Normalize windows for cross-correlation
+    before_norm = before_windows - before_windows.mean(axis=(2, 3), keepdims=True)
+    after_norm = after_windows - after_windows.mean(axis=(2, 3), keepdims=True)
+
+    # Calculate correlation for the tile
+    numerator = np.sum(before_norm * after_norm, axis=(2, 3))
+    denominator = np.sqrt(np.sum(before_norm**2, axis=(2, 3)) * np.sum(after_norm**2, axis=(2, 3)))
+
+    denominator[denominator == 0] = 1 # Avoid division by zero
+
+    return numerator / denominator
+
+
+CORRELATION_ENGINES = {
+    'integral': _correlation_tile_integral,
+    'windows': _correlation_tile_windows,
+}
+
+
+def _tile_with_halo(band: np.ndarray, r_start: int, r_end: int, c_start: int, c_end: int, halo: int) -> np.ndarray:
+    """
+    Returns band[r_start:r_end, c_start:c_end] grown by `halo` pixels on every side.
+
+    The halo is read from the band itself where it exists; only at true image borders is
+    the tile reflect-padded, which matches reflect-padding the whole image up front.
+    """
+    height, width = band.shape
+    row_lo, row_hi = max(0, r_start - halo), min(height, r_end + halo)
+    col_lo, col_hi = max(0, c_start - halo), min(width, c_end + halo)
+    tile = band[row_lo:row_hi, col_lo:col_hi]
+
+    pad = (
+        (halo - (r_start - row_lo), halo - (row_hi - r_end)),
+        (halo - (c_start - col_lo), halo - (col_hi - c_end)),
+    )
+    if any(before or after for before, after in pad):
+        tile = np.pad(tile, pad, mode='reflect')
+    return tile
+
+
+def calculate_correlation_map(before_band: np.ndarray, after_band: np.ndarray, window_size: int = 11, tile_size: int = 1024, engine: str = 'integral', workers: int = 1, out: np.ndarray | None = None, verbose: bool = True) -> np.ndarray:
     """
     Calculates a memory-efficient normalized cross-correlation map by processing in tiles.
+
+    The default 'integral' engine uses summed-area tables and costs O(H*W) regardless of
+    window size; 'windows' is the original sliding-window implementation, kept as a reference.
+    With workers > 1 the tiles are computed on a thread pool and written into the shared
+    output, which may be a preallocated array or np.memmap passed as `out`. Each tile reads
+    its window halo directly from the inputs, so no padded copy of the scene is made; tiles
+    that are entirely NaN (nodata) in either input are skipped and left as NaN.
     """
+    if engine not in CORRELATION_ENGINES:
+        raise ValueError(f"Unknown correlation engine '{engine}'. Options: {sorted(CORRELATION_ENGINES)}")
+    correlate_tile = CORRELATION_ENGINES[engine]
+
     if window_size % 2 == 0:
         window_size += 1
     pad_size = window_size // 2
 
     height, width = before_band.shape
-    correlation_map = np.zeros_like(before_band, dtype=np.float32)
-
-    # Pad the full images once at the beginning
-    before_padded = np.pad(before_band, pad_size, mode='reflect')
-    after_padded = np.pad(after_band, pad_size, mode='reflect')
-
-    print("Calculating correlation map in tiles...")
-    # Iterate through the image in tiles
-    for r in range(0, height, tile_size):
-        for c in range(0, width, tile_size):
-            # Define the tile boundaries for the original image
-            r_end = min(r + tile_size, height)
-            c_end = min(c + tile_size, width)
-            
-            # Define the tile boundaries for the padded image (to include window borders)
-            pr_start, pr_end = r, r_end + 2 * pad_size
-            pc_start, pc_end = c, c_end + 2 * pad_size
-
-            # Extract the tiles from the padded images
-            before_tile_padded = before_padded[pr_start:pr_end, pc_start:pc_end]
-            after_tile_padded = after_padded[pr_start:pr_end, pc_start:pc_end]
-
-            # Create sliding windows for the current tile
-            before_windows = view_as_windows(before_tile_padded, (window_size, window_size))
-            after_windows = view_as_windows(after_tile_padded, (window_size, window_size))
-            
-            # Normalize windows for cross-correlation
-            before_norm = before_windows - before_windows.mean(axis=(2, 3), keepdims=True)
-            after_norm = after_windows - after_windows.mean(axis=(2, 3), keepdims=True)
-            
-            # Calculate correlation for the tile
-            numerator = np.sum(before_norm * after_norm, axis=(2, 3))
-            denominator = np.sqrt(np.sum(before_norm**2, axis=(2, 3)) * np.sum(after_norm**2, axis=(2, 3)))
-            
-            denominator[denominator == 0] = 1 # Avoid division by zero
-            
-            tile_corr = numerator / denominator
-            
-            # Place the result into the final output map
-            correlation_map[r:r_end, c:c_end] = tile_corr
-
-    print("...Correlation map complete.")
+    if out is None:
+        correlation_map = np.zeros_like(before_band, dtype=np.float32)
+    elif out.shape != before_band.shape:
+        raise ValueError(f"Output shape {out.shape} does not match input shape {before_band.shape}.")
+    else:
+        correlation_map = out
+
+    def process_tile(r: int, c: int) -> None:
+        # Define the tile boundaries for the original image
+        r_end = min(r + tile_size, height)
+        c_end = min(c + tile_size, width)
+
+        # Tiles with no valid pixels in either band are nodata; skip them entirely
+        if np.isnan(before_band[r:r_end, c:c_end]).all() or np.isnan(after_band[r:r_end, c:c_end]).all():
+            correlation_map[r:r_end, c:c_end] = np.nan
+            return
+
+        # Extract each tile plus its halo straight from the unpadded bands
+        before_tile_padded = _tile_with_halo(before_band, r, r_end, c, c_end, pad_size)
+        after_tile_padded = _tile_with_halo(after_band, r, r_end, c, c_end, pad_size)
+
+        # Calculate correlation for the tile
+        tile_corr = correlate_tile(before_tile_padded, after_tile_padded, window_size)
+
+        # Place the result into the final output map; tiles never overlap, so no locking is needed
+        correlation_map[r:r_end, c:c_end] = tile_corr
+
+    tile_origins = [(r, c) for r in range(0, height, tile_size) for c in range(0, width, tile_size)]
+
+    if verbose:
+        print("Calculating correlation map in tiles...")
+    if workers > 1 and len(tile_origins) > 1:
+        # NumPy releases the GIL inside the cumsum/arithmetic kernels, so threads scale across cores
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for future in [pool.submit(process_tile, r, c) for r, c in tile_origins]:
+                future.result()
+    else:
+        for r, c in tile_origins:
+            process_tile(r, c)
+
+    if verbose:
+        print("...Correlation map complete.")
     return correlation_map
\ No newline at end of file
@@ -0,0 +1,157 @@
+import base64
+import struct
+import zlib
+
+import numpy as np
+
+# Risk in [0, 1] is stored as levels 0..254; 255 marks pixels without a score
+RISK_LEVELS = 254
+NODATA_LEVEL = 255
+
+
+def _risk_palette() -> tuple[bytes, bytes]:
+    """Green -> yellow -> red ramp over the risk levels, opacity rising with risk; nodata is transparent."""
+    t = np.arange(256, dtype=np.float32) / RISK_LEVELS
+    rgb = np.stack([np.minimum(1.0, 2 * t), np.minimum(1.0, 2 * (1 - t)), np.zeros_like(t)], axis=1)
+    rgb = np.clip(rgb * 255, 0, 255).astype(np.uint8)
+    alpha = np.clip(40 + t * 200, 0, 255).astype(np.uint8)
+    rgb[NODATA_LEVEL] = 0
+    alpha[NODATA_LEVEL] = 0
+    return rgb.tobytes(), alpha.tobytes()
+
+
+RISK_PALETTE, RISK_ALPHA = _risk_palette()
+
+
+def quantize_risk(risk: np.ndarray) -> np.ndarray:
+    """Maps float risk scores to uint8 levels (risk ~= level / 254); NaN becomes NODATA_LEVEL."""
+    risk = np.asarray(risk, dtype=np.float32)
+    valid = np.isfinite(risk)
+    levels = np.rint(np.clip(np.where(valid, risk, 0), 0, 1) * RISK_LEVELS).astype(np.uint8)
+    levels[~valid] = NODATA_LEVEL
+    return levels
+
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+
+def encode_png(levels: np.ndarray, compression: int = 6) -> bytes:
+    """
+    Encodes a 2D uint8 level array as an indexed-colour PNG using the risk palette.
+
+    Pixel values are the quantized levels themselves, so clients can both draw the tile
+    and recover risk scores from it.
+    """
+    levels = np.ascontiguousarray(levels, dtype=np.uint8)
+    height, width = levels.shape
+    # Every scanline is prefixed with filter type 0 (none)
+    scanlines = np.zeros((height, width + 1), dtype=np.uint8)
+    scanlines[:, 1:] = levels
+    header = struct.pack('>IIBBBBB', width, height, 8, 3, 0, 0, 0)
+    return b''.join([
+        b'\x89PNG\r\n\x1a\n',
+        _png_chunk(b'IHDR', header),
+        _png_chunk(b'PLTE', RISK_PALETTE),
+        _png_chunk(b'tRNS', RISK_ALPHA),
+        _png_chunk(b'IDAT', zlib.compress(scanlines.tobytes(), compression)),
+        _png_chunk(b'IEND', b''),
+    ])
+
+
+def downsample_levels(levels: np.ndarray) -> np.ndarray:
+    """Halves a level array by 2x2 max pooling, so small hotspots survive at coarse zoom."""
+    height, width = levels.shape
+    padded = np.full((height + height % 2, width + width % 2), -1, dtype=np.int16)
+    padded[:height, :width] = levels
+    padded[padded == NODATA_LEVEL] = -1
+    pooled = padded.reshape(padded.shape[0] // 2, 2, padded.shape[1] // 2, 2).max(axis=(1, 3))
+    pooled[pooled < 0] = NODATA_LEVEL
+    return pooled.astype(np.uint8)
+
+
+def build_level_pyramid(levels: np.ndarray, tile_size: int = 256) -> list[np.ndarray]:
+    """Returns the full-resolution levels followed by 2x reductions until the image fits in one tile."""
+    pyramid = [levels]
+    while max(pyramid[-1].shape) > tile_size:
+        pyramid.append(downsample_levels(pyramid[-1]))
+    return pyramid
+
+
+def iter_pyramid_tiles(pyramid: list[np.ndarray], tile_size: int = 256):
+    """
+    Yields (zoom, tile_row, tile_col, png_bytes) for every tile of a level pyramid.
+
+    Zoom 0 is the coarsest level (a single tile) and the last zoom is full resolution.
+    """
+    for zoom, levels in enumerate(reversed(pyramid)):
+        height, width = levels.shape
+        for row in range(0, height, tile_size):
+            for col in range(0, width, tile_size):
+                tile = levels[row:row + tile_size, col:col + tile_size]
+                yield zoom, row // tile_size, col // tile_size, encode_png(tile)
+
+
+def encode_mask_png(mask: np.ndarray, compression: int = 9) -> bytes:
+    """Encodes a 2D boolean mask as a 1-bit greyscale PNG (white = True), eight pixels per byte."""
+    mask = np.asarray(mask, dtype=bool)
+    height, width = mask.shape
+    packed = np.packbits(mask, axis=1)
+    scanlines = np.zeros((height, packed.shape[1] + 1), dtype=np.uint8)
+    scanlines[:, 1:] = packed
+    header = struct.pack('>IIBBBBB', width, height, 1, 0, 0, 0, 0)
+    return b''.join([
+        b'\x89PNG\r\n\x1a\n',
+        _png_chunk(b'IHDR', header),
+        _png_chunk(b'IDAT', zlib.compress(scanlines.tobytes(), compression)),
+        _png_chunk(b'IEND', b''),
+    ])
+
+
+def hotspot_mask_from_levels(levels: np.ndarray, threshold: float) -> np.ndarray:
+    """Pixels of a quantized level array whose risk is at or above `threshold` (to level precision)."""
+    return (levels != NODATA_LEVEL) & (levels >= np.rint(threshold * RISK_LEVELS))
+
+
+def encode_heatmap(risk: np.ndarray, transform=None, crs=None, threshold: float = 0.5, tile_size: int = 256, mask_max_bytes: int = 64 * 1024) -> dict:
+    """
+    Packs a risk raster into a compact, JSON-safe heatmap payload.
+
+    The payload carries the grid (shape, geotransform, CRS), the quantization used for
+    the tiles and a single base64 PNG overview (the coarsest pyramid level, at most
+    tile_size pixels on a side). The full-resolution mask of pixels at or above
+    `threshold` is inlined as a 1-bit PNG only while it compresses to `mask_max_bytes`
+    or less; larger masks are left out ('inline': False) and served separately, like
+    the full-resolution tiles rendered with iter_pyramid_tiles.
+    """
+    levels = quantize_risk(risk)
+    pyramid = build_level_pyramid(levels, tile_size)
+    overview = pyramid[-1]
+    mask = np.isfinite(risk) & (risk >= threshold)
+    mask_png = encode_mask_png(mask)
+    hotspot_mask = {
+        'threshold': threshold,
+        'encoding': 'png-1bit',
+        'pixel_count': int(mask.sum()),
+        'inline': len(mask_png) <= mask_max_bytes,
+    }
+    if hotspot_mask['inline']:
+        hotspot_mask['png_base64'] = base64.b64encode(mask_png).decode('ascii')
+
+    return {
+        'encoding': 'png-uint8-palette',
+        'width': int(levels.shape[1]),
+        'height': int(levels.shape[0]),
+        'transform': list(transform)[:6] if transform is not None else None,
+        'crs': str(crs) if crs is not None else None,
+        'quantization': {'scale': 1.0 / RISK_LEVELS, 'offset': 0.0, 'nodata': NODATA_LEVEL},
+        'tile_size': tile_size,
+        'max_zoom': len(pyramid) - 1,
+        'overview': {
+            'zoom': 0,
+            'width': int(overview.shape[1]),
+            'height': int(overview.shape[0]),
+            'png_base64': base64.b64encode(encode_png(overview)).decode('ascii'),
+        },
+        'hotspot_mask': hotspot_mask,
+    }
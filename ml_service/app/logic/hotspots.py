@@ -0,0 +1,84 @@
+import numpy as np
+from rasterio.warp import transform as transform_coords
+from scipy import ndimage
+
+from .feature_store import FeatureCube
+
+# 8-connectivity: diagonal neighbours belong to the same region
+EIGHT_CONNECTED = np.ones((3, 3), dtype=bool)
+
+
+def extract_hotspots(risk_scores: np.ndarray, features: FeatureCube | None = None, threshold: float = 0.5, top_k: int = 5, transform=None, crs=None) -> list[dict]:
+    """
+    Returns the top-k connected high-risk regions of a risk raster, highest peak score first.
+
+    Pixels at or above `threshold` are grouped into 8-connected regions. Every per-region
+    statistic (area, mean/max score, peak pixel, centroid, mean feature values) is reduced
+    over the foreground pixels only: np.bincount for sums and np.maximum.reduceat over the
+    label-sorted foreground for peaks, so the cost beyond labelling scales with the hotspot
+    area rather than the scene. np.argpartition selects the k strongest regions without
+    sorting them all. With a geotransform (and CRS) centroids are also reported in map
+    coordinates (and longitude/latitude).
+    """
+    risk_scores = np.asarray(risk_scores)
+    labels, n_regions = ndimage.label(risk_scores >= threshold, structure=EIGHT_CONNECTED)
+    if n_regions == 0:
+        return []
+
+    # Foreground pixels grouped by region; the stable sort keeps raster order within a region
+    foreground = np.flatnonzero(labels)
+    foreground_labels = labels.ravel()[foreground]
+    order = np.argsort(foreground_labels, kind='stable')
+    foreground, foreground_labels = foreground[order], foreground_labels[order]
+    foreground_scores = risk_scores.ravel()[foreground]
+
+    areas = np.bincount(foreground_labels, minlength=n_regions + 1)[1:]
+    score_sums = np.bincount(foreground_labels, weights=foreground_scores, minlength=n_regions + 1)[1:]
+    starts = np.concatenate([[0], np.cumsum(areas)[:-1]])
+    max_scores = np.maximum.reduceat(foreground_scores, starts)
+    region_ids = np.arange(1, n_regions + 1)
+
+    # Strongest peak first, larger regions break ties
+    k = min(top_k, n_regions)
+    candidates = np.argpartition(-max_scores, k - 1)[:k]
+    top = candidates[np.lexsort((-areas[candidates], -max_scores[candidates]))]
+    top_ids = region_ids[top]
+
+    rows, cols = np.divmod(foreground, labels.shape[1])
+    centroids = np.stack([
+        np.bincount(foreground_labels, weights=rows, minlength=n_regions + 1)[top_ids],
+        np.bincount(foreground_labels, weights=cols, minlength=n_regions + 1)[top_ids],
+    ], axis=1) / areas[top, None]
+    # First pixel in raster order reaching the region's maximum
+    peaks = [
+        (rows[start + offset], cols[start + offset])
+        for start, area in zip(starts[top], areas[top])
+        for offset in [int(np.argmax(foreground_scores[start:start + area]))]
+    ]
+    feature_means = {}
+    if features is not None:
+        for name in features.feature_names:
+            values = features.raster(name)[rows, cols]
+            feature_means[name] = np.bincount(foreground_labels, weights=values, minlength=n_regions + 1)[top_ids] / areas[top]
+
+    hotspots = []
+    for rank, region in enumerate(top):
+        centroid_row, centroid_col = centroids[rank]
+        hotspot = {
+            'rank': rank + 1,
+            'area_pixels': int(areas[region]),
+            'mean_score': float(score_sums[region] / areas[region]),
+            'max_score': float(max_scores[region]),
+            'peak': {'row': int(peaks[rank][0]), 'col': int(peaks[rank][1])},
+            'centroid': {'row': float(centroid_row), 'col': float(centroid_col)},
+            'features': {name: float(means[rank]) for name, means in feature_means.items()},
+        }
+        if transform is not None:
+            x, y = transform * (centroid_col + 0.5, centroid_row + 0.5)
+            hotspot['centroid'].update({'x': float(x), 'y': float(y)})
+            hotspot['area_map_units'] = float(areas[region] * abs(transform.a * transform.e))
+            if crs is not None:
+                lons, lats = transform_coords(crs, 'EPSG:4326', [x], [y])
+                hotspot['centroid'].update({'lon': float(lons[0]), 'lat': float(lats[0])})
+        hotspots.append(hotspot)
+    return hotspots
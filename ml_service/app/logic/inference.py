@@ -0,0 +1,216 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable
+
+import numpy as np
+import xgboost as xgb
+
+# Rows pushed through every tree at once by the NumPy evaluator; small batches keep its
+# (trees x rows) node matrices in cache
+COMPILED_BATCH_ROWS = 4096
+
+# Largest score difference from XGBoost accepted when verifying the compiled evaluator (~1 ulp near 1.0)
+VERIFY_TOLERANCE = 1e-6
+
+# Link functions applied to the summed margin, per supported objective
+_LINKS = {
+    'binary:logistic': 'sigmoid',
+    'reg:logistic': 'sigmoid',
+    'reg:squarederror': 'identity',
+}
+
+
+def _iteration_range(classifier: xgb.XGBClassifier) -> tuple[int, int]:
+    """Trees used by predict_proba: up to the best iteration when early stopping recorded one."""
+    try:
+        return 0, classifier.best_iteration + 1
+    except AttributeError:
+        return 0, 0
+
+
+class CompiledForest:
+    """
+    Pure-NumPy evaluator for an XGBoost gbtree model, parsed from the booster's JSON dump.
+
+    All trees are flattened into shared node arrays, and a batch of rows descends every tree
+    at once: each step gathers one split per (tree, row) pair, so a batch costs max_depth
+    vectorised passes. Splits compare float32 features with `x < split_condition`, missing
+    values follow the default direction, and the summed leaf values plus the base margin go
+    through the objective's link, as in XGBoost itself. Margins match XGBoost exactly;
+    probabilities agree to within one float32 ulp.
+    """
+
+    def __init__(self, booster: xgb.Booster, iteration_range: tuple[int, int] = (0, 0)):
+        learner = json.loads(booster.save_raw('json'))['learner']
+        objective = learner['objective']['name']
+        if objective not in _LINKS:
+            raise ValueError(f"Unsupported objective for the compiled evaluator: {objective}")
+        if learner['gradient_booster']['name'] != 'gbtree':
+            raise ValueError("The compiled evaluator only supports gbtree boosters.")
+        model = learner['gradient_booster']['model']
+        if any(group != 0 for group in model['tree_info']):
+            raise ValueError("The compiled evaluator only supports single-output models.")
+
+        # base_score is stored in output space ('[6.5E-1]' in recent releases, '6.5E-1' before);
+        # the logit is taken in float32, as XGBoost does, so margins match bit for bit
+        base_score = np.float32(learner['learner_model_param']['base_score'].strip('[]'))
+        self.link = _LINKS[objective]
+        self.base_margin = -np.log(np.float32(1) / base_score - np.float32(1)) if self.link == 'sigmoid' else base_score
+
+        trees = model['trees']
+        start, stop = iteration_range
+        if stop > 0:
+            trees_per_iteration = int(model['gbtree_model_param']['num_parallel_tree'])
+            trees = trees[start * trees_per_iteration:stop * trees_per_iteration]
+
+        lefts, rights, features, conditions, default_left, roots = [], [], [], [], [], []
+        offset = 0
+        for tree in trees:
+            if any(tree['split_type']):
+                raise ValueError("The compiled evaluator does not support categorical splits.")
+            left = np.asarray(tree['left_children'], dtype=np.int32)
+            right = np.asarray(tree['right_children'], dtype=np.int32)
+            is_leaf = left == -1
+            # Leaves point at themselves, so rows that arrive early simply stay put
+            node_ids = np.arange(left.size, dtype=np.int32) + offset
+            lefts.append(np.where(is_leaf, node_ids, left + offset))
+            rights.append(np.where(is_leaf, node_ids, right + offset))
+            features.append(np.asarray(tree['split_indices'], dtype=np.int32))
+            conditions.append(np.asarray(tree['split_conditions'], dtype=np.float32))  # Leaf value on leaves
+            default_left.append(np.asarray(tree['default_left'], dtype=bool))
+            roots.append(offset)
+            offset += left.size
+
+        self.n_trees = len(trees)
+        self.n_features = int(learner['learner_model_param']['num_feature'])
+        # children[2 * node] is the left child and children[2 * node + 1] the right one
+        self.children = np.empty(2 * offset, dtype=np.int32)
+        self.children[0::2] = np.concatenate(lefts)
+        self.children[1::2] = np.concatenate(rights)
+        self.feature = np.concatenate(features)
+        self.condition = np.concatenate(conditions)
+        self.default_left = np.concatenate(default_left)
+        self.roots = np.asarray(roots, dtype=np.int32)
+        self.max_depth = max((_tree_depth(tree) for tree in trees), default=0)
+
+    def predict_margin(self, X: np.ndarray, workers: int = 1) -> np.ndarray:
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        margin = np.empty(X.shape[0], dtype=np.float32)
+        batches = [slice(start, start + COMPILED_BATCH_ROWS) for start in range(0, X.shape[0], COMPILED_BATCH_ROWS)]
+        if workers > 1 and len(batches) > 1:
+            # NumPy releases the GIL inside take/compare, so batches overlap on separate cores
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                for future in [pool.submit(self._predict_batch, X, rows, margin) for rows in batches]:
+                    future.result()
+        else:
+            for rows in batches:
+                self._predict_batch(X, rows, margin)
+        return margin
+
+    def _predict_batch(self, X: np.ndarray, rows: slice, out: np.ndarray) -> None:
+        batch = X[rows]
+        values_flat = batch.ravel()
+        n_rows = batch.shape[0]
+        # Flat offset of each row's first feature; nodes are laid out (trees, rows)
+        row_offsets = (np.arange(n_rows, dtype=np.int32) * batch.shape[1])[np.newaxis, :]
+        nodes = np.repeat(self.roots[:, np.newaxis], n_rows, axis=1)
+        has_missing = bool(np.isnan(batch).any())
+
+        for _ in range(self.max_depth):
+            values = values_flat.take(row_offsets + self.feature.take(nodes))
+            go_right = ~(values < self.condition.take(nodes))
+            if has_missing:
+                go_right &= ~(np.isnan(values) & self.default_left.take(nodes))
+            nodes = self.children.take(2 * nodes + go_right)
+
+        # Accumulate tree by tree in float32 on top of the base margin, like XGBoost
+        total = np.full(n_rows, self.base_margin, dtype=np.float32)
+        for leaf_values in self.condition.take(nodes):
+            total += leaf_values
+        out[rows] = total
+
+    def predict(self, X: np.ndarray, workers: int = 1) -> np.ndarray:
+        """Returns float32 predictions in output space (probabilities for logistic objectives)."""
+        margin = self.predict_margin(X, workers=workers)
+        if self.link == 'sigmoid':
+            # exp in float64 rounded to float32 tracks expf far closer than NumPy's float32 exp
+            exp_neg = np.exp(-margin.astype(np.float64)).astype(np.float32)
+            exp_neg += np.float32(1)
+            return np.reciprocal(exp_neg, out=exp_neg)
+        return margin
+
+
+def _tree_depth(tree: dict) -> int:
+    left, right = tree['left_children'], tree['right_children']
+    depth, frontier = 0, [0]
+    while frontier:
+        frontier = [child for node in frontier if left[node] != -1 for child in (left[node], right[node])]
+        depth += bool(frontier)
+    return depth
+
+
+def verification_sample(forest: CompiledForest, rows: int = 4096, missing_fraction: float = 0.1, seed: int = 0) -> np.ndarray:
+    """
+    Returns float32 rows that exercise every branch of a forest: each feature is drawn from
+    its own split thresholds, landing exactly on, just below or just above one, and a
+    `missing_fraction` of the values are NaN so the default directions are taken too.
+    """
+    rng = np.random.default_rng(seed)
+    is_split = forest.children[0::2] != np.arange(forest.feature.size)
+    sample = rng.normal(size=(rows, forest.n_features)).astype(np.float32)
+    for feature in range(forest.n_features):
+        thresholds = forest.condition[is_split & (forest.feature == feature)]
+        if thresholds.size:
+            values = rng.choice(thresholds, size=rows)
+            side = rng.integers(-1, 2, size=rows)
+            sample[:, feature] = np.where(side == 0, values, np.nextafter(values, np.where(side < 0, -np.inf, np.inf).astype(np.float32)))
+    sample[rng.random(sample.shape) < missing_fraction] = np.nan
+    return sample
+
+
+def compile_forest(classifier: xgb.XGBClassifier, sample: np.ndarray | None = None) -> CompiledForest:
+    """
+    Builds the CompiledForest for the trees predict_proba uses and checks it against XGBoost
+    on `sample` (a verification_sample by default); raises ValueError if they disagree.
+    """
+    booster = classifier.get_booster()
+    iteration_range = _iteration_range(classifier)
+    forest = CompiledForest(booster, iteration_range)
+    if sample is None:
+        sample = verification_sample(forest)
+    if len(sample):
+        sample = np.ascontiguousarray(sample, dtype=np.float32)
+        expected = booster.inplace_predict(sample, iteration_range=iteration_range, validate_features=False)
+        mismatch = float(np.max(np.abs(expected - forest.predict(sample))))
+        if mismatch > VERIFY_TOLERANCE:
+            raise ValueError(f"Compiled evaluator disagrees with XGBoost by {mismatch:.3g} on the verification sample.")
+    return forest
+
+
+def make_scorer(classifier: xgb.XGBClassifier, backend: str = 'xgboost', workers: int = 1, sample: np.ndarray | None = None,
+                compiled: CompiledForest | None = None) -> Callable[[np.ndarray], np.ndarray]:
+    """
+    Returns a function mapping a float32 feature matrix to float32 positive-class scores.
+
+    'xgboost' calls Booster.inplace_predict directly on the contiguous array, skipping the
+    sklearn wrapper's DataFrame validation and float64 probability matrix; 'numpy' uses
+    the CompiledForest evaluator. Both use the same trees as predict_proba. Pass an already
+    verified `compiled` forest (see ModelRegistry.compiled) to reuse it; otherwise one is
+    built with compile_forest and checked on `sample` rows.
+    """
+    booster = classifier.get_booster()
+    iteration_range = _iteration_range(classifier)
+
+    def score_xgboost(X: np.ndarray) -> np.ndarray:
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        return booster.inplace_predict(X, iteration_range=iteration_range, validate_features=False)
+
+    if backend == 'xgboost':
+        return score_xgboost
+    if backend != 'numpy':
+        raise ValueError(f"Unknown inference backend: {backend}")
+
+    if compiled is None:
+        compiled = compile_forest(classifier, sample)
+    return partial(compiled.predict, workers=workers)
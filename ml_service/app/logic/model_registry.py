@@ -0,0 +1,145 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import xgboost as xgb
+
+from .inference import CompiledForest, compile_forest
+
+
+class UnknownModelVersionError(LookupError):
+    """Raised when a pinned model version is neither loaded nor found in the model directory."""
+
+
+def _file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ModelRegistry:
+    """
+    Lazily loaded, content-addressed cache of XGBoost models with hot reload.
+
+    The default model is read from `model_path` on first use. Every later lookup stats the
+    file, and when its size or mtime changed the new file is hashed, loaded and warmed up
+    while the previous model keeps serving; only then is the default swapped. Publish a
+    new model with an atomic rename (os.replace) so a half-written file is never read.
+
+    Models are keyed by the SHA-256 of their file. A request can pin a version by that
+    hash (or a unique prefix of it) or by the name of a model file in the model directory.
+    The NumPy evaluator of a version is compiled and verified once, on first use, and kept
+    for as long as the model itself.
+    """
+
+    def __init__(self, model_path: str, max_models: int = 4, warmup_rows: int = 1024):
+        self.model_path = model_path
+        self.model_dir = os.path.dirname(os.path.abspath(model_path))
+        self.max_models = max(2, max_models)  # Room for the default and one pinned model
+        self.warmup_rows = warmup_rows
+        self._models: OrderedDict[str, xgb.XGBClassifier] = OrderedDict()
+        self._compiled: dict[str, CompiledForest] = {}
+        self._current: str | None = None
+        self._current_stat: tuple[int, int] | None = None
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    def get(self, version: str | None = None) -> tuple[xgb.XGBClassifier, str]:
+        """Returns (model, version) for a pinned version, or for the current default model."""
+        if version:
+            return self._get_pinned(version)
+        self._refresh_default()
+        with self._lock:
+            return self._models[self._current], self._current
+
+    def compiled(self, version: str, model: xgb.XGBClassifier) -> CompiledForest:
+        """Returns the verified CompiledForest of a model returned by get, building it on first use."""
+        with self._lock:
+            forest = self._compiled.get(version)
+        if forest is not None:
+            return forest
+        with self._load_lock:
+            with self._lock:
+                forest = self._compiled.get(version)
+            if forest is None:
+                forest = compile_forest(model)
+                with self._lock:
+                    if version in self._models:
+                        self._compiled[version] = forest
+        return forest
+
+    def current_version(self) -> str | None:
+        with self._lock:
+            return self._current
+
+    def _refresh_default(self) -> None:
+        stat = os.stat(self.model_path)
+        signature = (stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            if signature == self._current_stat:
+                return
+
+        # One thread reloads; the rest wait here and find the new model already in place
+        with self._load_lock:
+            with self._lock:
+                if signature == self._current_stat:
+                    return
+            try:
+                version = self._load(self.model_path)
+            except Exception as e:
+                with self._lock:
+                    if self._current is None:
+                        raise
+                print(f"Could not reload model from {self.model_path}, keeping {self._current[:12]}: {e}")
+                return
+            with self._lock:
+                if version != self._current:
+                    print(f"Serving model {version[:12]} from {self.model_path}.")
+                self._current = version
+                self._current_stat = signature
+
+    def _get_pinned(self, version: str) -> tuple[xgb.XGBClassifier, str]:
+        with self._lock:
+            matches = [key for key in self._models if key.startswith(version)]
+            if len(matches) == 1:
+                self._models.move_to_end(matches[0])
+                return self._models[matches[0]], matches[0]
+
+        for name in (version, f"{version}.json"):
+            path = os.path.join(self.model_dir, name)
+            if os.path.basename(path) == name and os.path.isfile(path):
+                with self._load_lock:
+                    loaded = self._load(path)
+                with self._lock:
+                    return self._models[loaded], loaded
+        raise UnknownModelVersionError(f"Unknown model version: {version}")
+
+    def _load(self, path: str) -> str:
+        """Loads and warms up the model stored at `path` unless its content is already cached."""
+        version = _file_digest(path)
+        with self._lock:
+            if version in self._models:
+                self._models.move_to_end(version)
+                return version
+
+        model = xgb.XGBClassifier()
+        model.load_model(path)
+        self._warm_up(model)
+
+        with self._lock:
+            self._models[version] = model
+            while len(self._models) > self.max_models:
+                oldest = next(key for key in self._models if key != self._current and key != version)
+                del self._models[oldest]
+                self._compiled.pop(oldest, None)
+        print(f"ML model {version[:12]} loaded from {path}.")
+        return version
+
+    def _warm_up(self, model: xgb.XGBClassifier) -> None:
+        """Runs one dummy batch so the first real request does not pay for lazy initialisation."""
+        n_features = model.get_booster().num_features()
+        model.get_booster().inplace_predict(np.zeros((self.warmup_rows, n_features), dtype=np.float32), validate_features=False)
@@ -0,0 +1,210 @@
+import numpy as np
+
+from .aoi import aoi_window
+from .feature_cache import FeatureCache
+from .feature_store import FeatureCube
+from .features import allocate_sar_feature_buffers, calculate_correlation_map, calculate_sar_features
+from .raster_io import AlignedRasterReader
+from .speckle import speckle_filter
+
+# Request keys of the rasters the feature pipeline reads
+SAR_INPUTS = ('vv_before_path', 'vv_after_path', 'vh_before_path', 'vh_after_path')
+SLOPE_INPUT = 'slope_map_path'
+FEATURE_INPUTS = SAR_INPUTS + (SLOPE_INPUT,)
+
+# Bump whenever feature definitions change so cached cubes from older code are not reused
+FEATURE_PIPELINE_VERSION = 4
+
+
+def _resolve_inputs(file_paths: dict) -> dict[str, str]:
+    """Picks the rasters the pipeline reads out of a request-style path dictionary."""
+    input_paths = {key: file_paths[key] for key in SAR_INPUTS}
+    if file_paths.get(SLOPE_INPUT):
+        input_paths[SLOPE_INPUT] = file_paths[SLOPE_INPUT]
+    return input_paths
+
+
+def _feature_names(input_paths: dict[str, str]) -> list[str]:
+    names = ['backscatter_change', 'correlation', 'ratio_change']
+    if SLOPE_INPUT in input_paths:
+        names.insert(0, 'slope')
+    return names
+
+
+def _read_halo(window_size: int, speckle: str | None, filter_window_size: int) -> int:
+    """Pixels read around each block: the correlation halo, plus the speckle filter's own."""
+    return window_size // 2 + (filter_window_size // 2 if speckle else 0)
+
+
+def _shrink_halo(bands: dict[str, np.ndarray], inner: tuple[slice, slice], halo: int) -> tuple[dict[str, np.ndarray], tuple[slice, slice]]:
+    """Crops block arrays read with a wider halo down to `halo` pixels around the inner window."""
+    height, width = next(iter(bands.values())).shape
+    rows = slice(max(0, inner[0].start - halo), min(height, inner[0].stop + halo))
+    cols = slice(max(0, inner[1].start - halo), min(width, inner[1].stop + halo))
+    cropped = {name: array[rows, cols] for name, array in bands.items()}
+    shifted = (
+        slice(inner[0].start - rows.start, inner[0].stop - rows.start),
+        slice(inner[1].start - cols.start, inner[1].stop - cols.start),
+    )
+    return cropped, shifted
+
+
+def _valid_pixels(reader: AlignedRasterReader, bands: dict[str, np.ndarray], inner: tuple[slice, slice], features: dict[str, np.ndarray]) -> np.ndarray:
+    """
+    Pixels of a block where every input holds data (finite, not its raster's nodata value) and
+    every feature is defined; the correlation is not near nodata, for instance.
+    """
+    valid = np.ones((inner[0].stop - inner[0].start, inner[1].stop - inner[1].start), dtype=bool)
+    for values in features.values():
+        valid &= np.isfinite(values)
+    for name, band in bands.items():
+        block = band[inner]
+        valid &= np.isfinite(block)
+        nodata = reader.datasets[name].nodata
+        if nodata is not None and not np.isnan(nodata):
+            valid &= block != nodata
+    return valid
+
+
+def _iter_feature_blocks(reader: AlignedRasterReader, window_size: int, workers: int = 1, occupancy: np.ndarray | None = None,
+                         speckle: str | None = None, filter_window_size: int = 5):
+    """
+    Yields (window, features, valid) for every block of the reader, computing each feature once per block.
+
+    `valid` marks the block's pixels where every input holds data and every feature is defined. Blocks that `occupancy`
+    marks as empty are neither read nor computed; they are yielded with features and valid
+    set to None. With a `speckle` filter, the SAR bands are read with its
+    halo on top of the correlation halo and filtered before any feature is computed, then
+    cropped back to the correlation halo. The SAR layers are written into buffers that are
+    reused for the next block, so callers must copy what they need before advancing the
+    iterator.
+    """
+    halo = window_size // 2
+    buffers = allocate_sar_feature_buffers(reader.block_shape)
+    windows = reader.block_windows()
+    skipped = 0 if occupancy is None else int(occupancy.size - np.count_nonzero(occupancy))
+    print(f"Computing features over {len(windows) - skipped} block(s) of {reader.block_shape} ({skipped} empty block(s) skipped)...")
+    for window in windows:
+        if occupancy is not None and not occupancy[window.row_off // reader.block_shape[0], window.col_off // reader.block_shape[1]]:
+            yield window, None, None
+            continue
+        bands, inner = reader.read(window, halo=_read_halo(window_size, speckle, filter_window_size))
+        if speckle:
+            for name in SAR_INPUTS:
+                bands[name] = speckle_filter(
+                    bands[name].astype(np.float32), speckle, window_size=filter_window_size, workers=workers
+                )
+            bands, inner = _shrink_halo(bands, inner, halo)
+        block_buffers = {name: buffer[:window.height, :window.width] for name, buffer in buffers.items()}
+        sar_features = calculate_sar_features(
+            bands['vv_before_path'][inner], bands['vv_after_path'][inner],
+            bands['vh_before_path'][inner], bands['vh_after_path'][inner],
+            out=block_buffers
+        )
+        features = {
+            'backscatter_change': sar_features['backscatter_change'],
+            'ratio_change': sar_features['ratio_change'],
+        }
+
+        # The correlation window needs the halo; crop back to the block afterwards
+        correlation = calculate_correlation_map(
+            bands['vv_before_path'], bands['vv_after_path'],
+            window_size=window_size, workers=workers, verbose=False
+        )
+        features['correlation'] = correlation[inner]
+
+        if SLOPE_INPUT in bands:
+            features['slope'] = bands[SLOPE_INPUT][inner]
+        yield window, features, _valid_pixels(reader, bands, inner, features)
+    print("...Features complete.")
+
+
+def compute_feature_rasters(file_paths: dict, window_size: int = 11, block_size: int = 1024, workers: int = 1, aoi=None, skip_empty: bool = True, speckle: str | None = None, filter_window_size: int = 5) -> dict[str, np.ndarray]:
+    """
+    Streams the SAR (and optional slope) rasters block by block and computes every model feature.
+
+    Only one block of each input, plus a correlation halo, is held in memory at a time.
+    With an `aoi` geometry (in the rasters' CRS) the rasters cover only its bounding window.
+    Blocks with no valid SAR data, or outside the AOI, are skipped and left as NaN. A
+    `speckle` filter, when named, is applied to the SAR bands before the features.
+    """
+    if window_size % 2 == 0:
+        window_size += 1
+    input_paths = _resolve_inputs(file_paths)
+
+    with AlignedRasterReader(input_paths, block_size=block_size) as reader:
+        if aoi is not None:
+            reader.restrict(aoi_window(aoi, reader.transform, reader.shape, halo=_read_halo(window_size, speckle, filter_window_size)))
+        occupancy = reader.block_occupancy(names=SAR_INPUTS, aoi=aoi) if skip_empty else None
+        features = {name: np.empty(reader.shape, dtype=np.float32) for name in _feature_names(input_paths)}
+        for window, block_features, _ in _iter_feature_blocks(reader, window_size, workers, occupancy, speckle, filter_window_size):
+            rows, cols = window.toslices()
+            for name in features:
+                features[name][rows, cols] = np.nan if block_features is None else block_features[name]
+
+    return features
+
+
+def compute_feature_cube(file_paths: dict, window_size: int = 11, block_size: int = 1024, workers: int = 1, path: str | None = None, cache: FeatureCache | None = None, aoi=None, skip_empty: bool = True, speckle: str | None = None, filter_window_size: int = 5) -> FeatureCube:
+    """
+    Streams the input rasters block by block straight into a float32 FeatureCube.
+
+    With `path` the cube is memory-mapped on disk, so no full-scene feature array is ever
+    held in memory; NaNs are replaced with 0 as each block is written. With an `aoi`
+    geometry (in the rasters' CRS) the cube covers only the AOI's bounding window, and its
+    transform is that window's. Blocks with no valid SAR data (nodata collars), or outside
+    the AOI, are not computed and are marked empty in the cube; nodata pixels inside
+    computed blocks, and pixels whose features are undefined, are flagged in its validity
+    mask. `speckle` names a speckle filter ('lee', 'frost' or 'gamma_map') applied to the
+    SAR bands first. With a `cache`, a cube computed earlier from the same input files and
+    parameters is reused as-is, and a build that fails leaves no staging files behind.
+    """
+    if window_size % 2 == 0:
+        window_size += 1
+    input_paths = _resolve_inputs(file_paths)
+
+    cache_key = None
+    if cache is not None:
+        cache_key = cache.make_key(input_paths, {
+            'version': FEATURE_PIPELINE_VERSION, 'window_size': window_size,
+            'block_size': block_size, 'aoi': aoi, 'skip_empty': skip_empty,
+            'speckle': speckle, 'filter_window_size': filter_window_size if speckle else None,
+        })
+        cached_cube = cache.get(cache_key)
+        if cached_cube is not None:
+            print(f"Feature cache hit ({cache_key[:12]}); skipping feature computation.")
+            return cached_cube
+        path = cache.staging_path(cache_key)
+
+    cube = None
+    try:
+        with AlignedRasterReader(input_paths, block_size=block_size) as reader:
+            if aoi is not None:
+                # Only the AOI's bounding window (plus the correlation and filter halos) is read and computed
+                reader.restrict(aoi_window(aoi, reader.transform, reader.shape, halo=_read_halo(window_size, speckle, filter_window_size)))
+            occupancy = reader.block_occupancy(names=SAR_INPUTS, aoi=aoi) if skip_empty else None
+            cube = FeatureCube.create(
+                reader.shape, feature_names=_feature_names(input_paths), path=path,
+                transform=reader.transform, crs=reader.crs, block_shape=reader.block_shape
+            )
+            for window, block_features, valid in _iter_feature_blocks(reader, window_size, workers, occupancy, speckle, filter_window_size):
+                rows, cols = window.toslices()
+                if block_features is None:
+                    cube.mark_empty(rows, cols)
+                    for name in cube.feature_names:
+                        cube.write_block(name, rows, cols, 0)
+                    continue
+                for name, values in block_features.items():
+                    cube.write_block(name, rows, cols, values)
+                cube.write_valid(rows, cols, valid)
+        cube.flush()
+    except BaseException:
+        if cache is not None:
+            cube = None  # Release the writable memmap before its files are removed
+            cache.discard(path)
+        raise
+
+    if cache is not None:
+        del cube  # Release the writable memmap before the file is renamed into place
+        return cache.commit(cache_key, path)
+    return cube
@@ -2,62 +2,204 @@ import xgboost as xgb
 import pandas as pd
 import numpy as np
 
+from .. import config
+
 # Import your data processing and feature calculation functions
-from .data_processing import assemble_feature_table, match_shapes
-from .features import calculate_backscatter_change, calculate_vh_vv_ratio
-# You will also need your 'to_db' and other feature helpers here
+from .feature_cache import FeatureCache
+from .feature_store import FeatureCube
+from .aoi import aoi_pixel_mask, aoi_to_crs, parse_aoi_wkt
+from .cache_files import CacheLease
+from .coregistration import REFERENCE_INPUT, coregister_inputs, reference_grid, register_subpixel
+from .heatmap import encode_heatmap
+from .hotspots import extract_hotspots
+from .inference import CompiledForest, make_scorer
+from .model_registry import ModelRegistry
+from .pipeline import FEATURE_INPUTS, compute_feature_cube
+
+# --- 1. TRAINED models, loaded on first use and reloaded when the file changes ---
+model_registry = ModelRegistry(config.MODEL_PATH, max_models=config.MODEL_CACHE_SIZE)
+
+# Pixels scored per call; bounds the transient prediction buffer
+INFERENCE_CHUNK_ROWS = 1_000_000
+# Rows on which the compiled evaluator is checked against XGBoost before a run
+VERIFY_SAMPLE_ROWS = 4096
+
+# Repeat analyses of the same rasters reuse their cached feature cube
+feature_cache = None
+if config.FEATURE_CACHE_MAX_BYTES > 0:
+    feature_cache = FeatureCache(
+        config.FEATURE_CACHE_DIR, config.FEATURE_CACHE_MAX_BYTES, content_digest=config.FEATURE_CACHE_CONTENT_DIGEST
+    )
+
 
-# --- 1. Load the TRAINED model from file ---
-# This happens only once when the API server starts.
-MODEL_PATH = "himalayan_sentinel_model.json"
-model = xgb.XGBClassifier()
-model.load_model(MODEL_PATH)
-print("ML model loaded successfully.")
+def predict_risk_raster(classifier: xgb.XGBClassifier, cube: FeatureCube, chunk_rows: int = INFERENCE_CHUNK_ROWS, top_k: int = 1, out: np.ndarray | None = None, backend: str = 'xgboost', workers: int = 1, mask: np.ndarray | None = None, compiled: CompiledForest | None = None) -> tuple[np.ndarray, dict]:
+    """
+    Scores a FeatureCube in row chunks, writing landslide probabilities into a float32 raster.
 
+    Chunks are float32 views of the cube scored through make_scorer (Booster.inplace_predict,
+    or the compiled NumPy evaluator: `compiled` when given, otherwise one built here and
+    verified against XGBoost on the first rows). Pixels the cube marks invalid (empty
+    blocks, or nodata in any input), or outside the optional boolean `mask` (e.g. the AOI
+    polygon), are not scored and come out as NaN (nodata); only the pixels inside are
+    gathered, scored and scattered back into the raster.
 
-def generate_hypothesis(risk_scores: np.ndarray, features: pd.DataFrame) -> dict:
+    A running top-k of (score, pixel index) is kept while walking the chunks, so the
+    hotspot summary never needs a second pass over the full risk map.
+    """
+    risk_raster = np.empty(cube.shape, dtype=np.float32) if out is None else out
+    risk_flat = risk_raster.reshape(-1)
+    top_scores = np.empty(0, dtype=np.float32)
+    top_indices = np.empty(0, dtype=np.int64)
+    scorer = make_scorer(classifier, backend, workers=workers, sample=cube.data[:VERIFY_SAMPLE_ROWS], compiled=compiled)
+    mask_flat = mask.reshape(-1) if mask is not None else None
+
+    for rows, chunk in cube.iter_chunks(chunk_rows):
+        scores = risk_flat[rows]
+        valid = cube.valid_pixels(rows)
+        if mask_flat is not None:
+            valid = mask_flat[rows] if valid is None else valid & mask_flat[rows]
+        if valid is None:
+            scores[:] = scorer(chunk)
+            ranked = scores
+        elif valid.any():
+            # Invalid pixels and pixels outside the mask are not scored and stay nodata
+            scores[:] = np.nan
+            scores[valid] = scorer(chunk[valid])
+            ranked = np.where(valid, scores, -np.inf)
+        else:
+            scores[:] = np.nan
+            continue
+
+        k = min(top_k, scores.size)
+        candidates = np.argpartition(ranked, scores.size - k)[scores.size - k:]
+        top_scores = np.concatenate([top_scores, scores[candidates]])
+        top_indices = np.concatenate([top_indices, candidates + rows.start])
+        # Highest score first; ties go to the lowest pixel index, like argmax
+        order = np.lexsort((top_indices, -top_scores))[:top_k]
+        top_scores, top_indices = top_scores[order], top_indices[order]
+
+    top_risk = {
+        'scores': top_scores,
+        'indices': top_indices,
+        'rows': top_indices // cube.shape[1],
+        'cols': top_indices % cube.shape[1],
+    }
+    return risk_raster, top_risk
+
+
+def generate_hypothesis(risk_scores: np.ndarray, features: FeatureCube | pd.DataFrame, top_risk: dict | None = None, hotspots: list[dict] | None = None, heatmap: dict | None = None) -> dict:
     """Analyzes model output and feature data to generate a dynamic hypothesis."""
-    # (The function I gave you before goes here)
-    highest_risk_score = risk_scores.max()
-    # ... etc.
+    if top_risk is None:
+        highest_risk_index = int(np.argmax(risk_scores))
+        highest_risk_score = risk_scores.reshape(-1)[highest_risk_index]
+    elif len(top_risk['indices']) == 0:
+        # Every block was outside the data footprint
+        return {
+            "heatmap": heatmap or {"message": "Heatmap generation is the next step."},
+            "risk_score": 0.0,
+            "hypothesis_text": "Analysis complete. The inputs hold no valid data inside the area of interest.",
+            "hotspots": [],
+        }
+    else:
+        highest_risk_index = int(top_risk['indices'][0])
+        highest_risk_score = top_risk['scores'][0]
+
+    if isinstance(features, FeatureCube):
+        top_risk_features = dict(zip(features.feature_names, features.data[highest_risk_index]))
+    else:
+        top_risk_features = features.iloc[highest_risk_index].to_dict()
+
+    hypothesis_text = f"Analysis complete. Maximum detected risk score is {highest_risk_score:.2f}."
+    if 'slope' in top_risk_features and 'correlation' in top_risk_features:
+        hypothesis_text = (
+            f"Analysis complete. The highest risk was found on a slope of {top_risk_features['slope']:.1f} degrees. "
+            f"This location showed a correlation value of {top_risk_features['correlation']:.2f}. "
+            f"Maximum detected risk score is {highest_risk_score:.2f}."
+        )
+    if hotspots:
+        strongest = hotspots[0]
+        hypothesis_text += (
+            f" {len(hotspots)} high-risk region(s) were identified; the strongest covers "
+            f"{strongest['area_pixels']} pixels with a mean risk of {strongest['mean_score']:.2f}."
+        )
+
     response = {
-        "heatmap": {"message": "Heatmap generation is the next step."},
+        "heatmap": heatmap or {"message": "Heatmap generation is the next step."},
         "risk_score": float(highest_risk_score),
-        "hypothesis_text": f"Analysis complete. Maximum detected risk score is {highest_risk_score:.2f}."
+        "hypothesis_text": hypothesis_text,
+        "hotspots": hotspots or [],
     }
     return response
 
 
-def make_prediction(file_paths: dict) -> dict:
+def run_analysis(file_paths: dict, chunk_rows: int = INFERENCE_CHUNK_ROWS) -> tuple[dict, dict]:
     """
-    Loads real data from file paths, runs the trained model, and returns a hypothesis.
+    Runs the full pipeline and returns (response, risk), where risk holds the float32 risk
+    raster with its geotransform and CRS for rendering map tiles.
+
+    A 'model_version' entry in `file_paths` pins the model; otherwise the current default
+    model is used. An 'aoi_wkt' entry (EPSG:4326 polygon) restricts the analysis to the AOI,
+    and the returned rasters then cover its bounding window.
     """
-    # 2. Load the REAL data arrays from the file paths provided in the request
-    # with rasterio.open(file_paths["slope_map_path"]) as f:
-    #     slope_real = f.read(1)
-    # ... Load all 6 real data files ...
-
-    # For now, since you are still waiting on slope, we use mock data
-    # THIS IS TEMPORARY
-    from .mock_data import generate_mock_raster
-    slope_real = generate_mock_raster(100, 100, seed=303) * 60
-    backscatter_change_real = generate_mock_raster(100, 100, seed=1)
-    coherence_real = generate_mock_raster(100, 100, seed=2)
-    ratio_change_real = generate_mock_raster(100, 100, seed=3)
-    
-    # 3. Assemble the feature table
-    X_live = assemble_feature_table(
-        slope=slope_real,
-        backscatter_change=backscatter_change_real,
-        coherence=coherence_real,
-        ratio_change=ratio_change_real
+    # 1. Resolve the model once, so a reload mid-request cannot mix versions
+    model, model_version = model_registry.get(file_paths.get('model_version'))
+
+    # 2. Warp every input onto the vv_before grid, register the post-event pair, then stream them into the feature cube,
+    #    limited to the AOI's bounding window when the request carries one
+    # The lease keeps concurrent jobs from evicting the warped rasters until features are computed
+    with CacheLease() as lease:
+        aligned_paths = coregister_inputs(
+            file_paths, FEATURE_INPUTS, config.COREGISTRATION_CACHE_DIR,
+            max_bytes=config.COREGISTRATION_CACHE_MAX_BYTES, workers=config.PIPELINE_WORKERS, lease=lease
+        )
+        if config.SUBPIXEL_REGISTRATION:
+            # Residual misregistration would read as decorrelation, so the post-event pair is aligned first
+            aligned_paths = register_subpixel(
+                aligned_paths, config.COREGISTRATION_CACHE_DIR, degree=config.REGISTRATION_DEGREE,
+                workers=config.PIPELINE_WORKERS, max_bytes=config.COREGISTRATION_CACHE_MAX_BYTES, lease=lease
+            )
+        aoi = None
+        if file_paths.get('aoi_wkt'):
+            grid = reference_grid(aligned_paths[REFERENCE_INPUT])
+            aoi = aoi_to_crs(parse_aoi_wkt(file_paths['aoi_wkt']), grid['crs'])
+        X_live = compute_feature_cube(
+            aligned_paths, workers=config.PIPELINE_WORKERS, cache=feature_cache, aoi=aoi,
+            speckle=None if config.SPECKLE_FILTER == 'none' else config.SPECKLE_FILTER,
+            filter_window_size=config.FILTER_WINDOW_SIZE
+        )
+
+    # 3. Score the cube chunk by chunk into a float32 risk raster, only inside the AOI polygon
+    aoi_mask = aoi_pixel_mask(aoi, X_live.shape, X_live.transform) if aoi is not None else None
+    # The compiled evaluator is built and verified once per model version, not per request
+    compiled = model_registry.compiled(model_version, model) if config.INFERENCE_BACKEND == 'numpy' else None
+    risk_scores, top_risk = predict_risk_raster(
+        model, X_live, chunk_rows=chunk_rows, backend=config.INFERENCE_BACKEND,
+        workers=config.PIPELINE_WORKERS, mask=aoi_mask, compiled=compiled
+    )
+
+    # 4. Group high-risk pixels into ranked regions for analysts
+    hotspots = extract_hotspots(
+        risk_scores, X_live, threshold=config.HOTSPOT_THRESHOLD, top_k=config.HOTSPOT_TOP_K,
+        transform=X_live.transform, crs=X_live.crs
+    )
+
+    # 5. Quantize the risk raster into a compact heatmap payload
+    heatmap = encode_heatmap(
+        risk_scores, transform=X_live.transform, crs=X_live.crs,
+        threshold=config.HOTSPOT_THRESHOLD, tile_size=config.HEATMAP_TILE_SIZE,
+        mask_max_bytes=config.HEATMAP_MASK_INLINE_MAX_BYTES
     )
 
-    # 4. Use the loaded model to predict probabilities
-    predictions = model.predict_proba(X_live)
-    risk_scores = predictions[:, 1]  # Get the probability of the '1' class (landslide)
+    # 6. Generate the final response from the running top-k summary
+    final_response = generate_hypothesis(risk_scores, X_live, top_risk=top_risk, hotspots=hotspots, heatmap=heatmap)
+    final_response['model_version'] = model_version
+    risk = {'scores': risk_scores, 'transform': X_live.transform, 'crs': X_live.crs}
+    return final_response, risk
+
 
-    # 5. Generate the final response using your other new function
-    final_response = generate_hypothesis(risk_scores, X_live)
-    
-    return final_response
\ No newline at end of file
+def make_prediction(file_paths: dict, chunk_rows: int = INFERENCE_CHUNK_ROWS) -> dict:
+    """
+    Loads real data from file paths, runs the trained model, and returns a hypothesis.
+    """
+    final_response, _ = run_analysis(file_paths, chunk_rows=chunk_rows)
+    return final_response
@@ -0,0 +1,149 @@
+import math
+
+import numpy as np
+import rasterio
+from rasterio.enums import MaskFlags, Resampling
+from rasterio.features import geometry_mask
+from rasterio.transform import Affine
+from rasterio.windows import Window, transform as window_transform
+
+
+def _block_length(block_lengths: list[int], image_length: int, target: int) -> int:
+    """Picks a block length that is a whole multiple of every file's internal block length."""
+    unit = 1
+    for length in block_lengths:
+        unit = math.lcm(unit, min(length, image_length))
+    if unit >= image_length:
+        return image_length
+    return min(unit * max(1, math.ceil(target / unit)), image_length)
+
+
+class AlignedRasterReader:
+    """
+    Streams pixel-aligned windows from several single-band rasters, one block at a time.
+
+    Inputs are aligned on their top-left pixel and cropped to the smallest common shape,
+    matching the behaviour of match_shapes without ever reading a full scene.
+    """
+
+    def __init__(self, paths: dict[str, str], block_size: int = 1024):
+        if not paths:
+            raise ValueError("At least one raster path is required.")
+        self.datasets = {name: rasterio.open(path) for name, path in paths.items()}
+        reference = next(iter(self.datasets.values()))
+        self.height = min(ds.height for ds in self.datasets.values())
+        self.width = min(ds.width for ds in self.datasets.values())
+        self.transform = reference.transform
+        self.crs = reference.crs
+
+        self.block_size = block_size
+        self.row_offset, self.col_offset = 0, 0
+        self._update_block_shape()
+
+    def _update_block_shape(self) -> None:
+        # Blocks are multiples of each file's internal tiling so no internal block is decoded twice
+        block_shapes = [ds.block_shapes[0] for ds in self.datasets.values()]
+        self.block_shape = (
+            _block_length([shape[0] for shape in block_shapes], self.height, self.block_size),
+            _block_length([shape[1] for shape in block_shapes], self.width, self.block_size),
+        )
+
+    def restrict(self, window: Window) -> None:
+        """
+        Limits the reader to a window of the common extent, e.g. the bounding box of an AOI.
+
+        Blocks, shape, transform and reads are then all relative to that window, and only
+        its pixels (plus halos that stay inside it) are ever read.
+        """
+        self.transform = window_transform(window, self.transform)
+        self.row_offset += int(window.row_off)
+        self.col_offset += int(window.col_off)
+        self.height, self.width = int(window.height), int(window.width)
+        self._update_block_shape()
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.height, self.width
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self) -> None:
+        for ds in self.datasets.values():
+            ds.close()
+
+    def block_windows(self) -> list[Window]:
+        """Returns the block grid covering the common raster extent."""
+        block_height, block_width = self.block_shape
+        return [
+            Window(col, row, min(block_width, self.width - col), min(block_height, self.height - row))
+            for row in range(0, self.height, block_height)
+            for col in range(0, self.width, block_width)
+        ]
+
+    def read(self, window: Window, halo: int = 0) -> tuple[dict[str, np.ndarray], tuple[slice, slice]]:
+        """
+        Reads one window from every raster, grown by `halo` pixels where the image allows.
+
+        Returns the arrays and the (row, col) slices that select the original window from them.
+        """
+        row_start = max(0, window.row_off - halo)
+        col_start = max(0, window.col_off - halo)
+        row_stop = min(self.height, window.row_off + window.height + halo)
+        col_stop = min(self.width, window.col_off + window.width + halo)
+        # Offsets are relative to the (possibly restricted) extent; files are read in their own pixel space
+        expanded = Window(col_start + self.col_offset, row_start + self.row_offset, col_stop - col_start, row_stop - row_start)
+
+        arrays = {name: ds.read(1, window=expanded) for name, ds in self.datasets.items()}
+        inner = (
+            slice(window.row_off - row_start, window.row_off - row_start + window.height),
+            slice(window.col_off - col_start, window.col_off - col_start + window.width),
+        )
+        return arrays, inner
+
+    def iter_blocks(self, halo: int = 0):
+        """Yields (window, arrays, inner) for every block of the common extent."""
+        for window in self.block_windows():
+            arrays, inner = self.read(window, halo=halo)
+            yield window, arrays, inner
+
+    def block_occupancy(self, names=None, aoi=None, cells_per_block: int = 8) -> np.ndarray:
+        """
+        Returns a (block rows, block cols) boolean grid of blocks that hold data worth computing.
+
+        A block is occupied when every raster in `names` (all by default) has at least one
+        valid pixel in it, judged from each dataset's mask read at cells_per_block cells per
+        block side (served from overviews where the files have them), and, when an `aoi`
+        geometry in the rasters' CRS is given, when the AOI touches it.
+        """
+        block_height, block_width = self.block_shape
+        cell_height = max(1, block_height // cells_per_block)
+        cell_width = max(1, block_width // cells_per_block)
+        cells_shape = (-(-self.height // cell_height), -(-self.width // cell_width))
+
+        occupied_cells = np.ones(cells_shape, dtype=bool)
+        full_extent = Window(self.col_offset, self.row_offset, self.width, self.height)
+        for name in names or self.datasets:
+            ds = self.datasets[name]
+            if ds.mask_flag_enums[0] == [MaskFlags.all_valid]:
+                continue
+            # Averaged masks are non-zero wherever any pixel of a cell is valid
+            masks = ds.read_masks(1, window=full_extent, out_shape=cells_shape, resampling=Resampling.average)
+            occupied_cells &= masks > 0
+
+        if aoi is not None:
+            cell_transform = self.transform * Affine.scale(cell_width, cell_height)
+            occupied_cells &= ~geometry_mask([aoi], out_shape=cells_shape, transform=cell_transform, all_touched=True)
+
+        # A cell counts towards every block it overlaps (its first and last pixel's blocks)
+        grid = np.zeros((-(-self.height // block_height), -(-self.width // block_width)), dtype=bool)
+        cell_rows, cell_cols = np.arange(cells_shape[0]), np.arange(cells_shape[1])
+        row_blocks = [cell_rows * cell_height // block_height, (np.minimum((cell_rows + 1) * cell_height, self.height) - 1) // block_height]
+        col_blocks = [cell_cols * cell_width // block_width, (np.minimum((cell_cols + 1) * cell_width, self.width) - 1) // block_width]
+        for rows in row_blocks:
+            for cols in col_blocks:
+                np.logical_or.at(grid, (rows[:, np.newaxis], cols[np.newaxis, :]), occupied_cells)
+        return grid
@@ -0,0 +1,106 @@
+import numpy as np
+
+
+def _block_ids(indices: np.ndarray, shape: tuple[int, int], block_size: int) -> np.ndarray:
+    """Maps flat pixel indices to the id of the block_size x block_size block containing them."""
+    rows, cols = np.divmod(indices, shape[1])
+    blocks_per_row = -(-shape[1] // block_size)
+    return (rows // block_size) * blocks_per_row + cols // block_size
+
+
+def _near_validation(indices: np.ndarray, shape: tuple[int, int], block_size: int, is_validation_block: np.ndarray, buffer: int) -> np.ndarray:
+    """True for pixels within `buffer` pixels (Chebyshev distance) of a validation block."""
+    near = np.zeros(indices.size, dtype=bool)
+    if buffer <= 0:
+        return near
+    rows, cols = np.divmod(indices, shape[1])
+    blocks_per_row = -(-shape[1] // block_size)
+    for d_row in (-buffer, 0, buffer):
+        for d_col in (-buffer, 0, buffer):
+            r = np.clip(rows + d_row, 0, shape[0] - 1)
+            c = np.clip(cols + d_col, 0, shape[1] - 1)
+            near |= is_validation_block[(r // block_size) * blocks_per_row + c // block_size]
+    return near
+
+
+def _draw_positives(positives: np.ndarray, blocks: np.ndarray, size: int, rng: np.random.Generator) -> np.ndarray:
+    """Draws positives without replacement, weighting each by 1 / (positives in its block)."""
+    if size >= positives.size:
+        return positives
+    _, inverse, counts = np.unique(blocks, return_inverse=True, return_counts=True)
+    weights = 1.0 / counts[inverse]
+    return rng.choice(positives, size=size, replace=False, p=weights / weights.sum())
+
+
+def _draw_negatives(labels: np.ndarray, accept_block: np.ndarray, shape: tuple[int, int], block_size: int, size: int,
+                    rng: np.random.Generator, reject=None, valid: np.ndarray | None = None, max_rounds: int = 20) -> np.ndarray:
+    """
+    Draws negatives uniformly over the scene by rejection sampling.
+
+    Candidate pixels are drawn at random and kept when they are negative, valid and lie in
+    an accepted block, so the cost scales with `size` rather than with the scene area.
+    """
+    n_pixels = labels.size
+    drawn = np.empty(0, dtype=np.int64)
+    acceptance = max(accept_block.mean(), 1e-3)
+    for _ in range(max_rounds):
+        missing = size - drawn.size
+        if missing <= 0:
+            break
+        candidates = rng.integers(0, n_pixels, size=int(missing / acceptance * 1.2) + 16)
+        keep = (labels[candidates] == 0) & accept_block[_block_ids(candidates, shape, block_size)]
+        if valid is not None:
+            keep &= valid[candidates]
+        if reject is not None:
+            keep &= ~reject(candidates)
+        drawn = np.union1d(drawn, candidates[keep])
+    if drawn.size > size:
+        drawn = rng.choice(drawn, size=size, replace=False)
+    return drawn
+
+
+def spatial_block_sample(labels: np.ndarray, shape: tuple[int, int], budget: int, block_size: int = 64,
+                         positive_fraction: float = 0.5, validation_fraction: float = 0.2, buffer: int = 0,
+                         seed: int = 0, valid: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns (train, validation) flat pixel indices: a spatially blocked, label-stratified sample.
+
+    The scene is tiled into block_size blocks and a random `validation_fraction` of the
+    blocks is held out, so the two splits never share a block; training pixels within
+    `buffer` pixels (at most block_size) of a validation block are dropped as well. Set it
+    to the feature window radius to keep windows from straddling the split. Each split
+    receives its share of `budget` pixels, about `positive_fraction` of them positive.
+    Positives are weighted so that blocks with many positives do not dominate; negatives
+    are spread uniformly. Indices are sorted, so reads from a memory-mapped cube stay
+    sequential. Pixels where the optional `valid` mask is False (nodata) are never drawn.
+    """
+    labels = np.asarray(labels).reshape(-1)
+    rng = np.random.default_rng(seed)
+    buffer = min(buffer, block_size)
+    n_blocks = -(-shape[0] // block_size) * -(-shape[1] // block_size)
+    is_validation_block = np.zeros(n_blocks, dtype=bool)
+    if validation_fraction > 0:
+        n_validation = min(n_blocks - 1, max(1, round(n_blocks * validation_fraction)))
+        is_validation_block[rng.choice(n_blocks, size=n_validation, replace=False)] = True
+
+    if valid is not None:
+        valid = np.asarray(valid, dtype=bool).reshape(-1)
+    positives = np.flatnonzero(labels if valid is None else (labels != 0) & valid)
+    positive_blocks = _block_ids(positives, shape, block_size)
+
+    splits = []
+    for validation, share in ((False, 1 - validation_fraction), (True, validation_fraction)):
+        split_budget = int(round(budget * share))
+        accept_block = is_validation_block if validation else ~is_validation_block
+        reject = None
+        if not validation and buffer > 0:
+            def reject(indices):
+                return _near_validation(indices, shape, block_size, is_validation_block, buffer)
+
+        in_split = accept_block[positive_blocks]
+        if reject is not None:
+            in_split &= ~reject(positives)
+        split_positives = _draw_positives(positives[in_split], positive_blocks[in_split], int(round(split_budget * positive_fraction)), rng)
+        split_negatives = _draw_negatives(labels, accept_block, shape, block_size, split_budget - split_positives.size, rng, reject, valid)
+        splits.append(np.sort(np.concatenate([split_positives, split_negatives])))
+    return splits[0], splits[1]
@@ -0,0 +1,158 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from scipy import ndimage
+
+from .features import _box_sum, _integral_image, _tile_with_halo
+
+# Equivalent number of looks of Sentinel-1 IW GRD high-resolution intensity products
+DEFAULT_LOOKS = 4.4
+
+# Frost damping factor K, and the quantised damping levels its kernels are built for
+FROST_DAMPING = 2.0
+FROST_MAX_DAMPING = 4.0
+FROST_LEVELS = 16
+
+
+def _local_statistics(tile_padded: np.ndarray, window_size: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Returns (centre, mean, variance) of every window of a padded tile from running sums.
+
+    Only finite pixels count towards a window's statistics, so nodata does not leak into its
+    neighbours; windows with no valid pixel get a NaN mean and zero variance.
+    """
+    halo = window_size // 2
+    valid = np.isfinite(tile_padded)
+    x = np.where(valid, tile_padded, 0).astype(np.float64)
+    count = _box_sum(_integral_image(valid.astype(np.float64)), window_size)
+    sum_x = _box_sum(_integral_image(x), window_size)
+    sum_xx = _box_sum(_integral_image(x * x), window_size)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = sum_x / count
+        variance = np.clip(sum_xx / count - mean * mean, 0, None)
+    variance[count == 0] = 0
+    centre = tile_padded[halo:tile_padded.shape[0] - halo, halo:tile_padded.shape[1] - halo].astype(np.float64)
+    return centre, mean, variance
+
+
+def _variation_squared(mean: np.ndarray, variance: np.ndarray) -> np.ndarray:
+    """Squared local coefficient of variation; 0 (homogeneous) where the mean is not positive."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(mean > 0, variance / (mean * mean), 0)
+
+
+def _lee_tile(tile_padded: np.ndarray, window_size: int, looks: float) -> np.ndarray:
+    """Lee filter: the local mean plus a share of the deviation that exceeds the speckle level."""
+    centre, mean, variance = _local_statistics(tile_padded, window_size)
+    noise = 1.0 / looks  # Squared speckle coefficient of variation, Cu^2
+    ci2 = _variation_squared(mean, variance)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weight = np.where(ci2 > 0, (1 - noise / ci2) / (1 + noise), 0)
+    return mean + np.clip(weight, 0, 1) * (centre - mean)
+
+
+def _gamma_map_tile(tile_padded: np.ndarray, window_size: int, looks: float) -> np.ndarray:
+    """
+    Gamma-MAP filter (Lopes et al., 1990) for a gamma-distributed scene under L-look speckle.
+
+    Homogeneous windows (Ci <= Cu) take the local mean, point targets (Ci >= sqrt(2) Cu) keep
+    the pixel, and the rest take the maximum a posteriori estimate.
+    """
+    centre, mean, variance = _local_statistics(tile_padded, window_size)
+    noise = 1.0 / looks
+    ci2 = _variation_squared(mean, variance)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        alpha = (1 + noise) / (ci2 - noise)
+        b = alpha - looks - 1
+        discriminant = np.clip(mean * mean * b * b + 4 * alpha * looks * mean * centre, 0, None)
+        estimate = (b * mean + np.sqrt(discriminant)) / (2 * alpha)
+    return np.where(ci2 <= noise, mean, np.where(ci2 >= 2 * noise, centre, estimate))
+
+
+def _frost_tile(tile_padded: np.ndarray, window_size: int, looks: float, damping: float = FROST_DAMPING) -> np.ndarray:
+    """
+    Frost filter: a weighted mean with kernel exp(-K * Ci^2 * |r|) adapted to each window.
+
+    The distance |r| is taken as the city-block distance, which makes every kernel the
+    product of two 1-D exponentials. Kernels are built for FROST_LEVELS quantised damping
+    values and applied separably as normalised convolutions (nodata carries no weight);
+    each pixel interpolates between the two levels around its own damping.
+    """
+    halo = window_size // 2
+    _, mean, variance = _local_statistics(tile_padded, window_size)
+    level_step = FROST_MAX_DAMPING / (FROST_LEVELS - 1)
+    position = np.clip(damping * _variation_squared(mean, variance) / level_step, 0, FROST_LEVELS - 1)
+    lower = np.minimum(position.astype(np.intp), FROST_LEVELS - 2)
+    upper_share = position - lower
+
+    valid = np.isfinite(tile_padded)
+    x = np.where(valid, tile_padded, 0).astype(np.float64)
+    weights = valid.astype(np.float64)
+    all_valid = bool(valid.all())
+    distance = np.abs(np.arange(-halo, halo + 1, dtype=np.float64))
+    inner = (slice(halo, tile_padded.shape[0] - halo), slice(halo, tile_padded.shape[1] - halo))
+
+    filtered = np.zeros(mean.shape, dtype=np.float64)
+    used = np.union1d(np.unique(lower), np.unique(lower) + 1)
+    for level in used:
+        share = np.where(lower == level, 1 - upper_share, 0) + np.where(lower + 1 == level, upper_share, 0)
+        kernel = np.exp(-level * level_step * distance)
+        numerator = ndimage.correlate1d(ndimage.correlate1d(x, kernel, axis=0), kernel, axis=1)[inner]
+        if all_valid:
+            denominator = kernel.sum() ** 2
+        else:
+            denominator = ndimage.correlate1d(ndimage.correlate1d(weights, kernel, axis=0), kernel, axis=1)[inner]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            filtered += share * (numerator / denominator)
+    return filtered
+
+
+SPECKLE_FILTERS = {
+    'lee': _lee_tile,
+    'frost': _frost_tile,
+    'gamma_map': _gamma_map_tile,
+}
+
+
+def speckle_filter(band: np.ndarray, method: str = 'lee', window_size: int = 5, looks: float = DEFAULT_LOOKS, tile_size: int = 1024, workers: int = 1, out: np.ndarray | None = None) -> np.ndarray:
+    """
+    Suppresses speckle in a linear-intensity SAR band with a Lee, Frost or Gamma-MAP filter.
+
+    Local means and variances come from summed-area tables, so Lee and Gamma-MAP cost O(1)
+    per pixel whatever the window size, and Frost a few separable passes per damping level.
+    The band is processed in tiles that read their window halo from the band itself (it is
+    reflect-padded only at true borders), on a thread pool when workers > 1. NaN (nodata)
+    pixels stay NaN and are left out of their neighbours' statistics.
+    """
+    if method not in SPECKLE_FILTERS:
+        raise ValueError(f"Unknown speckle filter '{method}'. Options: {sorted(SPECKLE_FILTERS)}")
+    filter_tile = SPECKLE_FILTERS[method]
+    if window_size % 2 == 0:
+        window_size += 1
+    halo = window_size // 2
+
+    band = np.asarray(band, dtype=np.float32)
+    height, width = band.shape
+    filtered = np.empty_like(band) if out is None else out
+
+    def process_tile(r: int, c: int) -> None:
+        r_end = min(r + tile_size, height)
+        c_end = min(c + tile_size, width)
+        tile = band[r:r_end, c:c_end]
+        if np.isnan(tile).all():
+            filtered[r:r_end, c:c_end] = np.nan
+            return
+        result = filter_tile(_tile_with_halo(band, r, r_end, c, c_end, halo), window_size, looks)
+        result[np.isnan(tile)] = np.nan
+        filtered[r:r_end, c:c_end] = result
+
+    tile_origins = [(r, c) for r in range(0, height, tile_size) for c in range(0, width, tile_size)]
+    if workers > 1 and len(tile_origins) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for future in [pool.submit(process_tile, r, c) for r, c in tile_origins]:
+                future.result()
+    else:
+        for r, c in tile_origins:
+            process_tile(r, c)
+    return filtered
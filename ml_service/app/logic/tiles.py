@@ -0,0 +1,143 @@
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from rasterio.crs import CRS
+from rasterio.warp import transform as transform_coords, transform_bounds
+
+from .heatmap import NODATA_LEVEL, build_level_pyramid, encode_mask_png, encode_png, hotspot_mask_from_levels, quantize_risk
+
+WEB_MERCATOR = CRS.from_epsg(3857)
+# Half the width of the Web Mercator world square, in metres
+MERCATOR_EXTENT = 20037508.342789244
+TILE_SIZE = 256
+
+
+def tile_bounds(z: int, x: int, y: int) -> tuple[float, float, float, float]:
+    """Web Mercator (west, south, east, north) of an XYZ tile."""
+    span = 2 * MERCATOR_EXTENT / (1 << z)
+    west = -MERCATOR_EXTENT + x * span
+    north = MERCATOR_EXTENT - y * span
+    return west, north - span, west + span, north
+
+
+class RiskTileRenderer:
+    """
+    Renders Web Mercator XYZ PNG tiles from in-memory risk rasters.
+
+    Each registered raster is kept as a quantized uint8 level pyramid (2x max-pooled
+    overviews), so a zoomed-out tile samples a small overview instead of the full grid.
+    Rendered tiles are kept in an LRU of `cache_size` entries, and at most `max_rasters`
+    rasters are held, the least recently registered or viewed being dropped first.
+    """
+
+    def __init__(self, cache_size: int = 2048, max_rasters: int = 8, tile_size: int = TILE_SIZE):
+        self.cache_size = cache_size
+        self.max_rasters = max_rasters
+        self.tile_size = tile_size
+        self._rasters: OrderedDict[str, dict] = OrderedDict()
+        self._tiles: OrderedDict[tuple, bytes] = OrderedDict()
+        self._lock = threading.Lock()
+        self._blank_tile = encode_png(np.full((tile_size, tile_size), NODATA_LEVEL, dtype=np.uint8))
+
+    def add(self, raster_id: str, risk: np.ndarray, transform, crs) -> None:
+        """Registers a float risk raster (NaN = no data) with its geotransform and CRS."""
+        height, width = risk.shape
+        crs = CRS.from_user_input(crs)
+        raster = {
+            'pyramid': build_level_pyramid(quantize_risk(risk), self.tile_size),
+            'inverse': ~transform,
+            'crs': crs,
+            'width': width,
+            'height': height,
+            'mercator_bounds': transform_bounds(crs, WEB_MERCATOR, *_raster_bounds(transform, width, height)),
+        }
+        with self._lock:
+            self._rasters[raster_id] = raster
+            self._rasters.move_to_end(raster_id)
+            while len(self._rasters) > self.max_rasters:
+                dropped, _ = self._rasters.popitem(last=False)
+                self._drop_tiles(dropped)
+
+    def __contains__(self, raster_id: str) -> bool:
+        with self._lock:
+            return raster_id in self._rasters
+
+    def hotspot_mask(self, raster_id: str, threshold: float) -> bytes | None:
+        """Returns a full-resolution 1-bit PNG of a raster's pixels at or above `threshold`, or None."""
+        with self._lock:
+            raster = self._rasters.get(raster_id)
+            if raster is None:
+                return None
+            self._rasters.move_to_end(raster_id)
+        return encode_mask_png(hotspot_mask_from_levels(raster['pyramid'][0], threshold))
+
+    def render(self, raster_id: str, z: int, x: int, y: int) -> bytes | None:
+        """Returns the PNG for tile z/x/y of a raster, or None if the raster is not registered."""
+        key = (raster_id, z, x, y)
+        with self._lock:
+            raster = self._rasters.get(raster_id)
+            if raster is None:
+                return None
+            self._rasters.move_to_end(raster_id)
+            cached = self._tiles.get(key)
+            if cached is not None:
+                self._tiles.move_to_end(key)
+                return cached
+
+        png = self._render(raster, z, x, y)
+        with self._lock:
+            self._tiles[key] = png
+            while len(self._tiles) > self.cache_size:
+                self._tiles.popitem(last=False)
+        return png
+
+    def _drop_tiles(self, raster_id: str) -> None:
+        for key in [key for key in self._tiles if key[0] == raster_id]:
+            del self._tiles[key]
+
+    def _render(self, raster: dict, z: int, x: int, y: int) -> bytes:
+        west, south, east, north = tile_bounds(z, x, y)
+        r_west, r_south, r_east, r_north = raster['mercator_bounds']
+        if west >= r_east or east <= r_west or south >= r_north or north <= r_south:
+            return self._blank_tile
+
+        # Mercator coordinates of the tile's pixel centres
+        step = (east - west) / self.tile_size
+        xs = west + (np.arange(self.tile_size) + 0.5) * step
+        ys = north - (np.arange(self.tile_size) + 0.5) * step
+
+        if raster['crs'].is_geographic:
+            # Longitude depends only on x and latitude only on y, so transform one axis each
+            lons, _ = transform_coords(WEB_MERCATOR, raster['crs'], xs, np.zeros_like(xs))
+            _, lats = transform_coords(WEB_MERCATOR, raster['crs'], np.zeros_like(ys), ys)
+            src_x, src_y = np.meshgrid(lons, lats)
+        else:
+            grid_x, grid_y = np.meshgrid(xs, ys)
+            src_x, src_y = transform_coords(WEB_MERCATOR, raster['crs'], grid_x.ravel(), grid_y.ravel())
+            src_x = np.asarray(src_x).reshape(grid_x.shape)
+            src_y = np.asarray(src_y).reshape(grid_y.shape)
+
+        inverse = raster['inverse']
+        cols = inverse.a * src_x + inverse.b * src_y + inverse.c
+        rows = inverse.d * src_x + inverse.e * src_y + inverse.f
+
+        # Overview whose pixels are about as large as the tile's pixels
+        spacing = max(abs(cols[0, -1] - cols[0, 0]), abs(rows[-1, 0] - rows[0, 0])) / max(1, self.tile_size - 1)
+        pyramid = raster['pyramid']
+        level = int(np.clip(math.floor(math.log2(spacing)) if spacing > 0 else 0, 0, len(pyramid) - 1))
+        levels = pyramid[level]
+
+        valid = (cols >= 0) & (cols < raster['width']) & (rows >= 0) & (rows < raster['height'])
+        tile = np.full((self.tile_size, self.tile_size), NODATA_LEVEL, dtype=np.uint8)
+        tile[valid] = levels[
+            (rows[valid] // (1 << level)).astype(np.intp),
+            (cols[valid] // (1 << level)).astype(np.intp),
+        ]
+        return encode_png(tile)
+
+
+def _raster_bounds(transform, width: int, height: int) -> tuple[float, float, float, float]:
+    xs, ys = zip(*(transform * corner for corner in [(0, 0), (width, 0), (0, height), (width, height)]))
+    return min(xs), min(ys), max(xs), max(ys)
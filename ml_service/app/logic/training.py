@@ -0,0 +1,143 @@
+import glob
+import os
+import re
+from typing import Sequence
+
+import numpy as np
+import xgboost as xgb
+
+from .feature_store import FeatureCube
+
+# Pixels per training batch handed to XGBoost by the streaming iterator
+TRAINING_CHUNK_ROWS = 1_000_000
+
+DEFAULT_TRAINING_PARAMS = {
+    'objective': 'binary:logistic',
+    'eval_metric': 'logloss',
+    'tree_method': 'hist',
+}
+
+
+class FeatureCubeIter(xgb.DataIter):
+    """
+    Streams (features, labels) batches from one or more FeatureCubes for XGBoost.
+
+    Each scene is a FeatureCube (usually memory-mapped) plus a per-pixel label array of the
+    same length (a memmap works too), read chunk_rows pixels at a time. Positive pixels are
+    always kept; negatives are subsampled so that each scene contributes about
+    `negative_ratio` negatives per positive. Kept negatives are weighted by the inverse of
+    their keep rate when `reweight` is set, so predicted probabilities stay calibrated to
+    the full scene. Pixels the cube marks invalid (nodata) are dropped from every batch. The
+    subsample is seeded per (scene, chunk), so every pass XGBoost makes over the iterator
+    sees exactly the same batches.
+    """
+
+    def __init__(self, scenes: Sequence[tuple[FeatureCube, np.ndarray]], chunk_rows: int = TRAINING_CHUNK_ROWS,
+                 negative_ratio: float | None = 10.0, reweight: bool = True, seed: int = 0,
+                 cache_prefix: str | None = None):
+        self.scenes = list(scenes)
+        self.chunk_rows = chunk_rows
+        self.reweight = reweight
+        self.seed = seed
+        self._batches = [
+            (scene_index, slice(start, min(start + chunk_rows, cube.n_pixels)))
+            for scene_index, (cube, _) in enumerate(self.scenes)
+            for start in range(0, cube.n_pixels, chunk_rows)
+        ]
+        self.keep_rates = [self._negative_keep_rate(labels, negative_ratio) for _, labels in self.scenes]
+        self._position = 0
+        # With a cache prefix, external-memory pages are written to disk rather than host memory
+        super().__init__(cache_prefix=cache_prefix, on_host=False)
+
+    def _negative_keep_rate(self, labels: np.ndarray, negative_ratio: float | None) -> float:
+        if negative_ratio is None:
+            return 1.0
+        positives = sum(int(np.count_nonzero(labels[start:start + self.chunk_rows])) for start in range(0, len(labels), self.chunk_rows))
+        negatives = len(labels) - positives
+        if negatives == 0:
+            return 1.0
+        return min(1.0, negative_ratio * max(positives, 1) / negatives)
+
+    def next(self, input_data) -> bool:
+        if self._position >= len(self._batches):
+            return False
+        scene_index, rows = self._batches[self._position]
+        self._position += 1
+
+        cube, labels = self.scenes[scene_index]
+        features = np.asarray(cube.data[rows], dtype=np.float32)
+        chunk_labels = np.asarray(labels[rows], dtype=np.float32)
+        keep_rate = self.keep_rates[scene_index]
+        valid = cube.valid_pixels(rows)
+        if valid is not None:
+            features, chunk_labels = features[valid], chunk_labels[valid]
+
+        weights = None
+        if keep_rate < 1.0:
+            rng = np.random.default_rng([self.seed, scene_index, rows.start])
+            keep = (chunk_labels > 0) | (rng.random(chunk_labels.size) < keep_rate)
+            features, chunk_labels = features[keep], chunk_labels[keep]
+            if self.reweight:
+                weights = np.where(chunk_labels > 0, 1.0, 1.0 / keep_rate).astype(np.float32)
+
+        input_data(data=features, label=chunk_labels, weight=weights, feature_names=list(cube.feature_names))
+        return True
+
+    def reset(self) -> None:
+        self._position = 0
+
+
+def latest_checkpoint(checkpoint_dir: str, name: str = 'model') -> str | None:
+    """Returns the path of the newest TrainingCheckPoint file (JSON or UBJSON), or None."""
+    found = []
+    for path in glob.glob(os.path.join(checkpoint_dir, f"{name}_*")):
+        match = re.fullmatch(rf"{re.escape(name)}_(\d+)\.(json|ubj)", os.path.basename(path))
+        if match:
+            found.append((int(match.group(1)), path))
+    return max(found)[1] if found else None
+
+
+def train_streaming(scenes: Sequence[tuple[FeatureCube, np.ndarray]], num_boost_round: int = 100,
+                    params: dict | None = None, chunk_rows: int = TRAINING_CHUNK_ROWS,
+                    negative_ratio: float | None = 10.0, reweight: bool = True, seed: int = 0,
+                    nthread: int | None = None, max_bin: int = 256, external_memory: bool = False,
+                    cache_dir: str = 'training_cache', checkpoint_dir: str | None = None,
+                    checkpoint_interval: int = 10) -> xgb.Booster:
+    """
+    Trains a gradient-boosted landslide classifier over many scenes without loading them at once.
+
+    Feature cubes are streamed through FeatureCubeIter into a QuantileDMatrix, which keeps
+    only the quantised histogram index in memory (an ExtMemQuantileDMatrix paged through
+    `cache_dir` when `external_memory` is set). Histograms are built with `nthread`
+    threads (all cores by default). With a `checkpoint_dir`, the booster is saved every
+    `checkpoint_interval` rounds and an interrupted run resumes from the newest checkpoint.
+    """
+    params = {**DEFAULT_TRAINING_PARAMS, **(params or {}), 'max_bin': max_bin, 'seed': seed}
+    params['nthread'] = nthread or os.cpu_count() or 1
+
+    if external_memory:
+        os.makedirs(cache_dir, exist_ok=True)
+        iterator = FeatureCubeIter(scenes, chunk_rows, negative_ratio, reweight, seed, cache_prefix=os.path.join(cache_dir, 'cache'))
+        dtrain = xgb.ExtMemQuantileDMatrix(iterator, max_bin=max_bin, nthread=params['nthread'])
+    else:
+        iterator = FeatureCubeIter(scenes, chunk_rows, negative_ratio, reweight, seed)
+        dtrain = xgb.QuantileDMatrix(iterator, max_bin=max_bin, nthread=params['nthread'])
+    print(f"Training on {dtrain.num_row()} sampled pixels from {len(scenes)} scene(s); negative keep rates: "
+          + ", ".join(f"{rate:.3f}" for rate in iterator.keep_rates))
+
+    callbacks = []
+    start_model = None
+    rounds = num_boost_round
+    if checkpoint_dir:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        start_model = latest_checkpoint(checkpoint_dir)
+        if start_model:
+            completed = xgb.Booster(model_file=start_model).num_boosted_rounds()
+            rounds = max(0, num_boost_round - completed)
+            print(f"Resuming from checkpoint {start_model} ({completed} round(s) done, {rounds} to go).")
+        callbacks.append(xgb.callback.TrainingCheckPoint(directory=checkpoint_dir, interval=checkpoint_interval))
+
+    return xgb.train(
+        params, dtrain, num_boost_round=rounds, evals=[(dtrain, 'train')],
+        verbose_eval=checkpoint_interval, xgb_model=start_model, callbacks=callbacks
+    )
@@ -1,9 +1,42 @@
-from fastapi import FastAPI
-from app.models import AnalysisRequest, AnalysisResponse
-from app.logic.predictor import make_prediction
+from fastapi import FastAPI, HTTPException, Response, status
+from app import config
+from app.jobs import JobManager, QueueFullError
+from app.models import AnalysisRequest, AnalysisResponse, JobStatus
+from app.logic.aoi import AOIError, parse_aoi_wkt
+from app.logic.model_registry import UnknownModelVersionError
+from app.logic.predictor import make_prediction, model_registry, run_analysis
+from app.logic.tiles import RiskTileRenderer
 
 app = FastAPI(title="Himalayan Sentinel ML Service")
 
+# Risk rasters of recent jobs, rendered into map tiles on demand
+tile_renderer = RiskTileRenderer(cache_size=config.TILE_CACHE_SIZE, max_rasters=config.TILE_RASTER_LIMIT)
+
+def run_analysis_job(job_id: str, payload: dict) -> dict:
+    """Runs an analysis and keeps its risk raster so the job's map tiles can be served."""
+    prediction_results, risk = run_analysis(payload)
+    tile_renderer.add(job_id, risk['scores'], risk['transform'], risk['crs'])
+    prediction_results['heatmap']['tiles'] = f"/tiles/{job_id}/{{z}}/{{x}}/{{y}}.png"
+    prediction_results['heatmap']['hotspot_mask']['url'] = f"/jobs/{job_id}/hotspot_mask.png"
+    return prediction_results
+
+# Bounded pool for background analyses submitted through /jobs
+job_manager = JobManager(
+    run_analysis_job,
+    workers=config.JOB_WORKERS,
+    queue_depth=config.JOB_QUEUE_DEPTH,
+    history_limit=config.JOB_HISTORY_LIMIT,
+)
+
+@app.on_event("startup")
+def warm_up_model():
+    # Load and warm the default model before the first request arrives
+    model_registry.get()
+
+@app.on_event("shutdown")
+def shutdown_job_manager():
+    job_manager.shutdown(wait=False)
+
 @app.post("/analyze", response_model=AnalysisResponse)
 def analyze_data(request: AnalysisRequest):
     """
@@ -16,8 +49,62 @@ def analyze_data(request: AnalysisRequest):
     file_paths_dict = request.model_dump()
     
     # Call the main prediction function with the file paths
-    prediction_results = make_prediction(file_paths_dict)
+    try:
+        prediction_results = make_prediction(file_paths_dict)
+    except UnknownModelVersionError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except AOIError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
     
     # Return the results using the AnalysisResponse model.
     # The ** unpacks the dictionary into keyword arguments.
-    return AnalysisResponse(**prediction_results)
\ No newline at end of file
+    return AnalysisResponse(**prediction_results)
+
+@app.post("/jobs", response_model=JobStatus, status_code=status.HTTP_202_ACCEPTED)
+def submit_job(request: AnalysisRequest):
+    """
+    Queues the full ML pipeline on the background worker pool and returns the job id
+    immediately. Answers 429 when the queue is full.
+    """
+    if request.model_version:
+        # Reject unknown versions up front rather than failing the job later
+        try:
+            model_registry.get(request.model_version)
+        except UnknownModelVersionError as e:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    if request.aoi_wkt:
+        try:
+            parse_aoi_wkt(request.aoi_wkt)
+        except AOIError as e:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    try:
+        job_id = job_manager.submit(request.model_dump())
+    except QueueFullError as e:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e), headers={"Retry-After": "30"})
+    return JobStatus(**job_manager.get(job_id))
+
+@app.get("/jobs/{job_id}", response_model=JobStatus)
+def get_job(job_id: str):
+    """Returns the status of a queued analysis, with its results once completed."""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Unknown job id: {job_id}")
+    return JobStatus(**job)
+
+@app.get("/jobs/{job_id}/hotspot_mask.png")
+def get_hotspot_mask(job_id: str):
+    """Serves a completed job's full-resolution hotspot mask as a 1-bit PNG."""
+    png = tile_renderer.hotspot_mask(job_id, config.HOTSPOT_THRESHOLD)
+    if png is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"No risk raster for job id: {job_id}")
+    return Response(content=png, media_type="image/png", headers={"Cache-Control": "public, max-age=3600"})
+
+@app.get("/tiles/{job_id}/{z}/{x}/{y}.png")
+def get_tile(job_id: str, z: int, x: int, y: int):
+    """Serves a Web Mercator XYZ tile of a completed job's risk raster as a PNG."""
+    if not 0 <= z <= 30 or not (0 <= x < 1 << z and 0 <= y < 1 << z):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Tile {z}/{x}/{y} does not exist.")
+    png = tile_renderer.render(job_id, z, x, y)
+    if png is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"No risk raster for job id: {job_id}")
+    return Response(content=png, media_type="image/png", headers={"Cache-Control": "public, max-age=3600"})
@@ -1,3 +1,5 @@
+from datetime import datetime
+
 from pydantic import BaseModel
 
 class AnalysisRequest(BaseModel):
@@ -7,8 +9,21 @@ class AnalysisRequest(BaseModel):
     vh_before_path: str
     vh_after_path: str
     slope_map_path: str
+    model_version: str | None = None  # Model file name or content hash; defaults to the current model
+    aoi_wkt: str | None = None  # Polygon in EPSG:4326 (e.g. MLRequest.area_coordinates); limits the analysis to it
 
 class AnalysisResponse(BaseModel):
     heatmap: dict
     risk_score: float
-    hypothesis_text: str
\ No newline at end of file
+    hypothesis_text: str
+    hotspots: list[dict] = []
+    model_version: str | None = None
+
+class JobStatus(BaseModel):
+    job_id: str
+    status: str  # queued, running, completed or failed
+    created_at: datetime
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+    result: AnalysisResponse | None = None
+    error: str | None = None
@@ -1,69 +1,89 @@
 import sys
 import os
 import json
+import argparse
 import xgboost as xgb
 import numpy as np
 import pandas as pd
-import rasterio
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from ml_service.app.logic.features import calculate_backscatter_change, calculate_vh_vv_ratio, calculate_correlation_map
-from ml_service.app.logic.data_processing import match_shapes, assemble_feature_table, create_rule_based_labels
+from ml_service.app import config
+from ml_service.app.logic.coregistration import coregister_inputs, register_subpixel
+from ml_service.app.logic.pipeline import FEATURE_INPUTS, compute_feature_cube
+from ml_service.app.logic.data_processing import create_rule_based_labels
+from ml_service.app.logic.heatmap import build_level_pyramid, encode_heatmap, encode_mask_png, hotspot_mask_from_levels, iter_pyramid_tiles, quantize_risk
+from ml_service.app.logic.hotspots import extract_hotspots
+from ml_service.app.logic.sampling import spatial_block_sample
+from ml_service.app.logic.training import train_streaming
 
-def main():
+def main(streaming: bool = False, checkpoint_dir: str | None = None, sample_budget: int | None = None):
     """Runs the full pipeline to train a model and generate a final result JSON."""
     print("--- Starting Final Asset Generation ---")
 
-    # 1. LOAD REAL DATA
-    print("Step 1: Loading real data files...")
-    vv_before_path = 'data/pre_event_vv.tif'
-    vv_after_path = 'data/post_event_vv.tif'
-    vh_before_path = 'data/pre_event_vh.tif'
-    vh_after_path = 'data/post_event_vh.tif'
-    slope_path = 'data/dem_slope.tif'
-
-    with rasterio.open(vv_before_path) as f: vv_before = f.read(1)
-    with rasterio.open(vv_after_path) as f: vv_after = f.read(1)
-    with rasterio.open(vh_before_path) as f: vh_before = f.read(1)
-    with rasterio.open(vh_after_path) as f: vh_after = f.read(1)
-    with rasterio.open(slope_path) as f: slope = f.read(1)
-
-    # 2. MATCH SHAPES
-    print("Step 2: Matching data shapes...")
-    vv_before, vv_after = match_shapes(vv_before, vv_after)
-    vh_before, vh_after = match_shapes(vh_before, vh_after)
-    slope, _ = match_shapes(slope, vv_before)
+    # 1. LOCATE REAL DATA
+    print("Step 1: Locating real data files...")
+    file_paths = {
+        'vv_before_path': 'data/pre_event_vv.tif',
+        'vv_after_path': 'data/post_event_vv.tif',
+        'vh_before_path': 'data/pre_event_vh.tif',
+        'vh_after_path': 'data/post_event_vh.tif',
+        'slope_map_path': 'data/dem_slope.tif',
+    }
 
-    # 3. CALCULATE FEATURES
-    print("Step 3: Calculating features...")
-    backscatter_change = calculate_backscatter_change(vv_before, vv_after)
-    ratio_before = calculate_vh_vv_ratio(vh_before, vv_before)
-    ratio_after = calculate_vh_vv_ratio(vh_after, vv_after)
-    ratio_change = ratio_after - ratio_before
-    correlation_map = calculate_correlation_map(vv_before, vv_after, window_size=11) # <-- CORRECTED
+    # 2. CO-REGISTER EVERY INPUT ONTO THE SAR GRID
+    print("Step 2: Co-registering inputs onto the pre-event VV grid...")
+    file_paths = coregister_inputs(file_paths, FEATURE_INPUTS, cache_dir='data/coregistered', workers=os.cpu_count() or 1)
+    # Same sub-pixel alignment of the post-event pair as the live service, so features match
+    file_paths = register_subpixel(file_paths, cache_dir='data/coregistered', workers=os.cpu_count() or 1)
 
-    # 4. ASSEMBLE DATASET (X) and LABELS (y)
-    print("Step 4: Assembling dataset...")
-    X = assemble_feature_table(slope, backscatter_change, correlation_map, ratio_change) # <-- CORRECTED
-    y = create_rule_based_labels(correlation_map, slope) # <-- CORRECTED
-    X.fillna(0, inplace=True)
+    # 3-4. STREAM ALIGNED BLOCKS INTO THE FEATURE CUBE (X) and LABELS (y)
+    print("Step 3-4: Streaming aligned blocks into the feature cube...")
+    # Speckle-filtered exactly as the live service will filter its inputs
+    cube = compute_feature_cube(
+        file_paths, window_size=11, path='data/feature_cube.npy',
+        speckle=None if config.SPECKLE_FILTER == 'none' else config.SPECKLE_FILTER,
+        filter_window_size=config.FILTER_WINDOW_SIZE
+    )
+    X = cube.data  # float32 memmap; NaNs were already replaced with 0 block by block
+    # Nodata pixels were zero-filled, so they get no label and are kept out of training
+    valid = cube.valid_raster()
+    y = create_rule_based_labels(np.where(valid, cube.raster('correlation'), np.nan), cube.raster('slope')).reshape(-1) # <-- CORRECTED
+    valid_flat = valid.reshape(-1)
 
     # 5. TRAIN AND SAVE MODEL
     print("Step 5: Training and saving the model...")
-    model = xgb.XGBClassifier(use_label_encoder=False, eval_metric='logloss')
-    model.fit(X, y)
-    model.save_model("himalayan_sentinel_model.json")
+    if streaming:
+        # Stream the memmapped cube in chunks, keeping all positives and a class-balanced share of negatives
+        booster = train_streaming([(cube, y.astype(np.uint8))], checkpoint_dir=checkpoint_dir)
+        booster.save_model("himalayan_sentinel_model.json")
+        model = xgb.XGBClassifier()
+        model.load_model("himalayan_sentinel_model.json")
+    elif sample_budget:
+        # Fit on a spatially blocked, label-stratified sample and validate on held-out blocks
+        train_idx, val_idx = spatial_block_sample(y, cube.shape, sample_budget, buffer=11 // 2, valid=valid_flat)
+        print(f"...Sampled {train_idx.size} training and {val_idx.size} validation pixels from spatially disjoint blocks")
+        model = xgb.XGBClassifier(use_label_encoder=False, eval_metric='logloss')
+        model.fit(X[train_idx], y[train_idx], eval_set=[(X[val_idx], y[val_idx])], verbose=False)
+        print(f"...Validation logloss: {model.evals_result()['validation_0']['logloss'][-1]:.4f}")
+        model.get_booster().feature_names = list(cube.feature_names)
+        model.save_model("himalayan_sentinel_model.json")
+    else:
+        model = xgb.XGBClassifier(use_label_encoder=False, eval_metric='logloss')
+        model.fit(X[valid_flat], y[valid_flat])
+        model.get_booster().feature_names = list(cube.feature_names)
+        model.save_model("himalayan_sentinel_model.json")
     print("...Model saved as himalayan_sentinel_model.json")
 
     # 6. GENERATE AND SAVE FINAL RESULT
     print("Step 6: Generating and saving final result...")
     predictions = model.predict_proba(X)
-    risk_scores = predictions[:, 1]
-    
-    highest_risk_score = risk_scores.max()
-    highest_risk_index = risk_scores.argmax()
-    top_risk_features = X.iloc[highest_risk_index]
+    risk_scores = predictions[:, 1].astype(np.float32)
+    risk_scores[~valid_flat] = np.nan  # Nodata pixels stay out of the hotspots and heatmap
+
+    highest_risk_score = np.nanmax(risk_scores)
+    highest_risk_index = np.nanargmax(risk_scores)
+    top_risk_features = dict(zip(cube.feature_names, X[highest_risk_index]))
     slope_at_risk = top_risk_features['slope']
     correlation_at_risk = top_risk_features['correlation'] # <-- CORRECTED
 
@@ -73,10 +93,27 @@ def main():
         f"Maximum detected risk score is {highest_risk_score:.2f}."
     )
 
+    risk_raster = risk_scores.reshape(cube.shape)
+    hotspots = extract_hotspots(risk_raster, cube, transform=cube.transform, crs=cube.crs)
+
+    # Compact heatmap payload plus the full PNG tile pyramid for lazy loading
+    heatmap = encode_heatmap(risk_raster, transform=cube.transform, crs=cube.crs)
+    pyramid = build_level_pyramid(quantize_risk(risk_raster), heatmap['tile_size'])
+    for zoom, tile_row, tile_col, png in iter_pyramid_tiles(pyramid, heatmap['tile_size']):
+        os.makedirs(f'data/heatmap/{zoom}/{tile_row}', exist_ok=True)
+        with open(f'data/heatmap/{zoom}/{tile_row}/{tile_col}.png', 'wb') as f:
+            f.write(png)
+    heatmap['tiles'] = 'heatmap/{z}/{y}/{x}.png'
+    with open('data/heatmap/hotspot_mask.png', 'wb') as f:
+        f.write(encode_mask_png(hotspot_mask_from_levels(pyramid[0], heatmap['hotspot_mask']['threshold'])))
+    heatmap['hotspot_mask']['url'] = 'heatmap/hotspot_mask.png'
+    print(f"...Heatmap tiles written to data/heatmap (zoom 0-{heatmap['max_zoom']})")
+
     final_result = {
-        "heatmap": {"message": "Final heatmap generation is handled by the frontend visualization."},
+        "heatmap": heatmap,
         "risk_score": float(highest_risk_score),
-        "hypothesis_text": hypothesis_text
+        "hypothesis_text": hypothesis_text,
+        "hotspots": hotspots
     }
 
     with open('data/case_study_1_result.json', 'w') as f:
@@ -85,4 +122,9 @@ def main():
     print("--- Final Asset Generation Complete ---")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Train the landslide model and generate the final result JSON.")
+    parser.add_argument("--streaming", action="store_true", help="Train out of core with class-balanced subsampling")
+    parser.add_argument("--checkpoint-dir", default=None, help="Save (and resume from) training checkpoints here")
+    parser.add_argument("--sample-budget", type=int, default=None, help="Train in memory on this many spatially sampled pixels")
+    args = parser.parse_args()
+    main(streaming=args.streaming, checkpoint_dir=args.checkpoint_dir, sample_budget=args.sample_budget)
\ No newline at end of file
@@ -0,0 +1,39 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ml_service.app.logic.coregistration import evaluate_shift_field, fit_shift_field
+
+SHAPE = (2048, 2048)
+
+
+def _tile_shifts(row_shift, col_shift, upsample_factor=20, noise=0.02, tiles_per_axis=8, seed=0):
+    """Tile shifts of a uniform offset as estimate_tile_shifts reports them: noisy, then quantised."""
+    rng = np.random.default_rng(seed)
+    centres = (np.arange(tiles_per_axis) + 0.5) * SHAPE[0] / tiles_per_axis
+    rows, cols = (grid.ravel() for grid in np.meshgrid(centres, centres, indexing='ij'))
+    measured = np.array([row_shift, col_shift]) + rng.normal(0, noise, (rows.size, 2))
+    measured = np.round(measured * upsample_factor) / upsample_factor
+    return np.column_stack([rows, cols, measured, np.ones(rows.size)])
+
+
+def test_uniform_shift_keeps_quantised_tiles():
+    tile_shifts = _tile_shifts(0.33, -0.71)
+    field = fit_shift_field(tile_shifts, SHAPE, upsample_factor=20)
+    assert field['inliers'] == field['tiles']
+    assert field['rms_residual'] < 0.05
+    row_shift, col_shift = evaluate_shift_field(field, np.array([0.0, 2047.0]), np.array([0.0, 2047.0]))
+    np.testing.assert_allclose(row_shift, 0.33, atol=0.02)
+    np.testing.assert_allclose(col_shift, -0.71, atol=0.02)
+
+
+def test_outlier_tiles_are_rejected():
+    tile_shifts = _tile_shifts(0.33, -0.71)
+    tile_shifts[:5, 2:4] += 2.0  # Tiles over changed terrain
+    field = fit_shift_field(tile_shifts, SHAPE, upsample_factor=20)
+    assert field['inliers'] == field['tiles'] - 5
+    row_shift, _ = evaluate_shift_field(field, np.array([1024.0]), np.array([1024.0]))
+    np.testing.assert_allclose(row_shift, 0.33, atol=0.02)
@@ -0,0 +1,47 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ml_service.app.logic.features import calculate_correlation_map
+
+
+def _sar_pair(height, width, seed=0):
+    rng = np.random.default_rng(seed)
+    before = rng.gamma(4.4, 1 / 4.4, (height, width)).astype(np.float32)
+    after = (before * rng.gamma(4.4, 1 / 4.4, (height, width))).astype(np.float32)
+    return before, after
+
+
+def _assert_engines_match(before, after, **kwargs):
+    integral = calculate_correlation_map(before, after, engine='integral', verbose=False, **kwargs)
+    windows = calculate_correlation_map(before, after, engine='windows', verbose=False, **kwargs)
+    np.testing.assert_array_equal(np.isnan(integral), np.isnan(windows))
+    np.testing.assert_allclose(integral, windows, atol=1e-5, equal_nan=True)
+    return integral
+
+
+def test_integral_matches_windows():
+    before, after = _sar_pair(300, 260)
+    _assert_engines_match(before, after, window_size=11, tile_size=128)
+
+
+def test_nodata_patch_only_affects_touching_windows():
+    before, after = _sar_pair(300, 260)
+    before[100:120, 50:70] = np.nan
+    correlation = _assert_engines_match(before, after, window_size=11, tile_size=128)
+    # A 20x20 patch reaches the windows centred up to 5 pixels outside it
+    assert np.isnan(correlation).sum() == 30 * 30
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_partial_nodata_collar(workers):
+    before, after = _sar_pair(256, 300)
+    before[:, :90] = np.nan
+    after[:40, :] = np.nan
+    correlation = _assert_engines_match(before, after, window_size=7, tile_size=100, workers=workers)
+    assert np.isfinite(correlation[60:, 120:]).all()
+    assert np.isnan(correlation[:, :90]).all()
@@ -0,0 +1,87 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+import rasterio
+from rasterio.transform import from_origin
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ml_service.app.logic import pipeline
+from ml_service.app.logic.coregistration import coregister_inputs
+from ml_service.app.logic.feature_cache import FeatureCache
+from ml_service.app.logic.pipeline import SAR_INPUTS, compute_feature_cube
+
+
+def _write_raster(path, data, pixel_size=10.0):
+    profile = {
+        'driver': 'GTiff', 'dtype': 'float32', 'count': 1, 'nodata': np.nan, 'crs': 'EPSG:32643',
+        'transform': from_origin(500000, 3300000, pixel_size, pixel_size),
+        'width': data.shape[1], 'height': data.shape[0],
+    }
+    with rasterio.open(path, 'w', **profile) as dst:
+        dst.write(data.astype(np.float32), 1)
+    return str(path)
+
+
+@pytest.fixture
+def scene(tmp_path):
+    rng = np.random.default_rng(0)
+    file_paths = {key: _write_raster(tmp_path / f"{key}.tif", rng.gamma(4.4, 1 / 4.4, (200, 180))) for key in SAR_INPUTS}
+    # A slope raster on a coarser grid, so coregister_inputs has to warp it
+    file_paths['slope_path'] = _write_raster(tmp_path / 'slope.tif', rng.uniform(0, 60, (100, 90)), pixel_size=20.0)
+    return file_paths
+
+
+def _cache(tmp_path):
+    return FeatureCache(str(tmp_path / 'features'), max_bytes=1024**3)
+
+
+def _hits(capsys):
+    return capsys.readouterr().out.count('Feature cache hit')
+
+
+def test_repeat_call_hits(scene, tmp_path, capsys):
+    cache = _cache(tmp_path)
+    first = compute_feature_cube(scene, block_size=64, cache=cache)
+    assert _hits(capsys) == 0
+    second = compute_feature_cube(scene, block_size=64, cache=cache)
+    assert _hits(capsys) == 1
+    np.testing.assert_array_equal(first.data, second.data)
+
+
+def test_changed_input_or_parameter_misses(scene, tmp_path, capsys):
+    cache = _cache(tmp_path)
+    compute_feature_cube(scene, block_size=64, cache=cache)
+    compute_feature_cube(scene, window_size=7, block_size=64, cache=cache)
+    assert _hits(capsys) == 0
+
+    with rasterio.open(scene['vv_after_path']) as src:
+        data = src.read(1)
+    _write_raster(scene['vv_after_path'], data * 2)
+    compute_feature_cube(scene, block_size=64, cache=cache)
+    assert _hits(capsys) == 0
+
+
+def test_repeat_call_through_coregistration_hits(scene, tmp_path, capsys):
+    cache = _cache(tmp_path)
+    coregistration_dir = str(tmp_path / 'coregistered')
+    for _ in range(2):
+        aligned = coregister_inputs(scene, [*SAR_INPUTS, 'slope_path'], coregistration_dir)
+        assert aligned['slope_path'] != scene['slope_path']
+        compute_feature_cube(aligned, block_size=64, cache=cache)
+    assert _hits(capsys) == 1
+
+
+def test_failed_build_leaves_no_staging_files(scene, tmp_path, monkeypatch):
+    cache = _cache(tmp_path)
+
+    def failing_blocks(*args, **kwargs):
+        raise RuntimeError("read error")
+        yield
+
+    monkeypatch.setattr(pipeline, '_iter_feature_blocks', failing_blocks)
+    with pytest.raises(RuntimeError):
+        compute_feature_cube(scene, block_size=64, cache=cache)
+    assert os.listdir(cache.cache_dir) == []
@@ -0,0 +1,51 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+import xgboost as xgb
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ml_service.app.logic.inference import CompiledForest, make_scorer
+from ml_service.app.logic.model_registry import ModelRegistry
+
+
+def _with_missing(X, fraction, rng):
+    X = X.copy()
+    X[rng.random(X.shape) < fraction] = np.nan
+    return X
+
+
+@pytest.fixture(scope='module')
+def classifier():
+    rng = np.random.default_rng(0)
+    X = _with_missing(rng.normal(size=(4000, 4)).astype(np.float32), 0.1, rng)
+    y = (np.nan_to_num(X[:, 0]) - np.nan_to_num(X[:, 1]) + rng.normal(0, 0.5, len(X)) > 0).astype(np.uint8)
+    model = xgb.XGBClassifier(n_estimators=40, max_depth=5, tree_method='hist')
+    model.fit(X, y)
+    return model
+
+
+@pytest.mark.parametrize('missing_fraction', [0.0, 0.2, 1.0])
+def test_compiled_forest_matches_inplace_predict(classifier, missing_fraction):
+    rng = np.random.default_rng(1)
+    X = _with_missing(rng.normal(size=(10000, 4)).astype(np.float32), missing_fraction, rng)
+    booster = classifier.get_booster()
+    expected = booster.inplace_predict(X, validate_features=False)
+    forest = CompiledForest(booster)
+    np.testing.assert_allclose(forest.predict(X), expected, rtol=0, atol=1e-6)
+    np.testing.assert_allclose(forest.predict(X, workers=4), expected, rtol=0, atol=1e-6)
+
+
+def test_registry_compiles_each_version_once(classifier, tmp_path):
+    model_path = str(tmp_path / 'model.json')
+    classifier.save_model(model_path)
+    registry = ModelRegistry(model_path)
+    model, version = registry.get()
+    forest = registry.compiled(version, model)
+    assert registry.compiled(version, model) is forest
+
+    X = np.random.default_rng(2).normal(size=(100, 4)).astype(np.float32)
+    scorer = make_scorer(model, 'numpy', compiled=forest)
+    np.testing.assert_allclose(scorer(X), model.get_booster().inplace_predict(X, validate_features=False), rtol=0, atol=1e-6)
@@ -0,0 +1,80 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+# The service imports its modules as 'app.*', relative to ml_service
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+from app import main
+from app.jobs import JobManager
+
+REQUEST = {
+    'coherence_map_path': 'coherence.tif',
+    'vv_before_path': 'pre_event_vv.tif', 'vv_after_path': 'post_event_vv.tif',
+    'vh_before_path': 'pre_event_vh.tif', 'vh_after_path': 'post_event_vh.tif',
+    'slope_map_path': 'slope.tif',
+}
+
+
+@pytest.fixture
+def release():
+    return threading.Event()
+
+
+@pytest.fixture
+def client(monkeypatch, release):
+    """A client whose analyses wait for `release` and then return a fixed result, one at a time."""
+    def run_job(job_id, payload):
+        release.wait(timeout=10)
+        return {'heatmap': {}, 'risk_score': 0.9, 'hypothesis_text': f"job {job_id}", 'hotspots': []}
+
+    manager = JobManager(run_job, workers=1, queue_depth=1)
+    monkeypatch.setattr(main, 'job_manager', manager)
+    yield TestClient(main.app)
+    release.set()
+    manager.shutdown()
+
+
+def _wait_for(client, job_id, status, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/jobs/{job_id}").json()
+        if job['status'] == status:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} never reached '{status}'")
+
+
+def test_full_queue_answers_429(client):
+    running = client.post('/jobs', json=REQUEST)
+    assert running.status_code == 202
+    _wait_for(client, running.json()['job_id'], 'running')
+    queued = client.post('/jobs', json=REQUEST)
+    assert queued.status_code == 202
+    assert queued.json()['status'] == 'queued'
+
+    rejected = client.post('/jobs', json=REQUEST)
+    assert rejected.status_code == 429
+    assert 'Retry-After' in rejected.headers
+
+
+def test_job_runs_to_completion(client, release):
+    submitted = client.post('/jobs', json=REQUEST)
+    assert submitted.status_code == 202
+    job_id = submitted.json()['job_id']
+    release.set()
+
+    job = _wait_for(client, job_id, 'completed')
+    assert job['result']['risk_score'] == 0.9
+    assert job['result']['hypothesis_text'] == f"job {job_id}"
+    assert job['finished_at'] is not None
+    # A finished job frees its slot
+    assert client.post('/jobs', json=REQUEST).status_code == 202
+
+
+def test_unknown_job_is_404(client):
+    assert client.get('/jobs/does-not-exist').status_code == 404